@@ -5,8 +5,14 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel
-import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
+import threading
+import time
+
+from user_store import UserStore
 
 # Security configuration
 SECRET_KEY = "your-secret-key-here"  # Change this in production!
@@ -33,22 +39,13 @@ class TokenData(BaseModel):
     username: Optional[str] = None
 
 # User data storage
-USERS_FILE = "users.json"
-
-def get_users():
-    if os.path.exists(USERS_FILE):
-        with open(USERS_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
-def save_users(users):
-    with open(USERS_FILE, "w") as f:
-        json.dump(users, f)
+USERS_DB = os.getenv("USERS_DB", "users.db")
+USERS_FILE = "users.json"  # Legacy storage, imported into the database once
+user_store = UserStore(USERS_DB)
 
 def get_user(username: str):
-    users = get_users()
-    if username in users:
-        user_dict = users[username]
+    user_dict = user_store.get_user(username)
+    if user_dict is not None:
         return UserInDB(**user_dict)
     return None
 
@@ -66,6 +63,93 @@ def authenticate_user(username: str, password: str):
         return False
     return user
 
+# Password hashing pool
+# bcrypt takes tens to hundreds of milliseconds per call and would block the event
+# loop, so hashing runs on a few dedicated threads (bcrypt releases the GIL).
+# Requests beyond the queue limit are turned away at once instead of piling up.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", 32))
+
+class HashingPoolFull(Exception):
+    """Raised when the password hashing pool has no room for another job"""
+
+class PasswordHashingPool:
+    def __init__(self, workers: int, max_queued: int, window: int = 1000):
+        """
+        Args:
+            workers (int): Threads running bcrypt
+            max_queued (int): Jobs allowed to wait for a free thread
+            window (int): Number of recent jobs kept for the latency percentiles
+        """
+        self.workers = workers
+        self.max_queued = max_queued
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._pending = 0  # Jobs queued or running
+        self.completed = 0
+        self.rejected = 0
+        self._wait_ms = deque(maxlen=window)
+        self._run_ms = deque(maxlen=window)
+
+    async def run(self, fn, *args):
+        """
+        Run fn(*args) on the pool and wait for the result without blocking the event loop.
+
+        Raises:
+            HashingPoolFull: If every thread is busy and the queue is full
+        """
+        with self._lock:
+            if self._pending >= self.workers + self.max_queued:
+                self.rejected += 1
+                raise HashingPoolFull()
+            self._pending += 1
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._pending -= 1
+                    self.completed += 1
+                    self._wait_ms.append((started - submitted) * 1000)
+                    self._run_ms.append((finished - started) * 1000)
+
+        return await asyncio.wrap_future(self._executor.submit(timed))
+
+    def metrics(self) -> dict:
+        """Pool occupancy, counters and queue-wait/run-time percentiles (ms) of recent jobs"""
+        with self._lock:
+            wait_ms, run_ms = sorted(self._wait_ms), sorted(self._run_ms)
+            metrics = {
+                "workers": self.workers,
+                "max_queued": self.max_queued,
+                "pending": self._pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+        for name, values in (("wait_ms", wait_ms), ("run_ms", run_ms)):
+            metrics[name] = {
+                f"p{q}": round(values[min(len(values) - 1, len(values) * q // 100)], 2) if values else None
+                for q in (50, 95, 99)
+            }
+        return metrics
+
+hashing_pool = PasswordHashingPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE)
+
+async def run_password_job(fn, *args):
+    """Run a hashing or verification call on the pool, answering 503 when it is saturated"""
+    try:
+        return await hashing_pool.run(fn, *args)
+    except HashingPoolFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login requests, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -0,0 +1,96 @@
+"""
+Intent matching for the fitness chatbot.
+All keywords are compiled into one word-boundary regex, so a message is
+scanned once no matter how many intents there are, and "hi" no longer fires
+on "this" or "new" on "renew". The intents found are then resolved by
+priority, in the order the chatbot has always checked them.
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Keyword groups; each phrase must appear as whole words
+INTENT_KEYWORDS: Dict[str, List[str]] = {
+    "greeting": ["hi", "hello", "hey"],
+    "help": ["help"],
+    "thanks": ["thanks", "thank you"],
+    "bye": ["bye", "goodbye"],
+    "beginner": ["beginner", "start", "starting", "new", "first time"],
+    "intermediate": ["intermediate"],
+    "advanced": ["advanced"],
+    "weight_loss": ["lose weight", "weight loss", "burn fat", "slim down"],
+    "muscle_gain": ["gain muscle", "build muscle", "get stronger", "bulk up"],
+    "maintenance": ["maintain", "maintenance", "stay same"],
+    "squat": ["squat", "squats"],
+    "deadlift": ["deadlift", "deadlifts"],
+    "pushup": ["push", "pushup", "pushups", "push-up", "push-ups"],
+    "form_cue": ["form", "how to", "proper", "correct"],
+    "motivation": ["motivation", "tired", "hard", "difficult", "can't", "cannot", "don't want"],
+}
+
+# (intent, keyword groups that must all be present), highest priority first.
+# Intents are (FITNESS_RESPONSES section, key); motivation has no fixed key.
+INTENT_RULES: List[Tuple[Tuple[str, Optional[str]], Tuple[str, ...]]] = [
+    (("general", "hi"), ("greeting",)),
+    (("general", "help"), ("help",)),
+    (("general", "thanks"), ("thanks",)),
+    (("general", "bye"), ("bye",)),
+    (("workout", "beginner"), ("beginner",)),
+    (("workout", "intermediate"), ("intermediate",)),
+    (("workout", "advanced"), ("advanced",)),
+    (("nutrition", "weight_loss"), ("weight_loss",)),
+    (("nutrition", "muscle_gain"), ("muscle_gain",)),
+    (("nutrition", "maintenance"), ("maintenance",)),
+    (("form", "squat"), ("squat", "form_cue")),
+    (("form", "deadlift"), ("deadlift", "form_cue")),
+    (("form", "pushup"), ("pushup", "form_cue")),
+    (("motivation", None), ("motivation",)),
+]
+
+Intent = Tuple[str, Optional[str]]
+
+class IntentMatcher:
+    def __init__(self,
+                 keywords: Dict[str, List[str]] = INTENT_KEYWORDS,
+                 rules: Sequence[Tuple[Intent, Tuple[str, ...]]] = INTENT_RULES,
+                 cache_size: int = 4096):
+        """
+        Args:
+            keywords: Keyword group name -> phrases
+            rules: (intent, required groups) in priority order
+            cache_size (int): Distinct messages whose intent is remembered
+        """
+        self.rules = list(rules)
+        self._groups = list(keywords)
+        # One named alternative per group; longer phrases first so "push-up" wins over "push"
+        pattern = "|".join(
+            f"(?P<g{i}>" + "|".join(re.escape(phrase) for phrase in sorted(phrases, key=len, reverse=True)) + ")"
+            for i, phrases in enumerate(keywords.values())
+        )
+        self._pattern = re.compile(rf"(?<!\w)(?:{pattern})(?!\w)")
+        self.classify = lru_cache(maxsize=cache_size)(self._classify)
+
+    def groups(self, message: str) -> set:
+        """Keyword groups present in the message, found in a single scan"""
+        return {self._groups[int(match.lastgroup[1:])] for match in self._pattern.finditer(message.lower())}
+
+    def _classify(self, message: str) -> Optional[Intent]:
+        found = self.groups(message)
+        for intent, required in self.rules:
+            if found.issuperset(required):
+                return intent
+        return None
+
+    def classify_many(self, messages: Iterable[str]) -> List[Optional[Intent]]:
+        """Intents of a batch of messages, e.g. a chat log, in order; repeats hit the cache"""
+        return [self.classify(message) for message in messages]
+
+matcher = IntentMatcher()
+
+def classify(message: str) -> Optional[Intent]:
+    """Highest-priority intent of a message, or None if nothing matches"""
+    return matcher.classify(message)
+
+def classify_many(messages: Iterable[str]) -> List[Optional[Intent]]:
+    return matcher.classify_many(messages)
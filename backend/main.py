@@ -4,19 +4,21 @@ from fastapi.middleware.cors import CORSMiddleware
 from datetime import timedelta, datetime
 from typing import Optional, Dict, List
 from pydantic import BaseModel
-import json
 import os
+import random
 import jwt
 from passlib.context import CryptContext
 import cohere
-import requests
 from dotenv import load_dotenv
 
 from auth import (
     User, UserInDB, Token, authenticate_user, create_access_token,
-    get_current_active_user, get_password_hash, get_users, save_users,
-    ACCESS_TOKEN_EXPIRE_MINUTES
+    get_current_active_user, get_password_hash, user_store,
+    hashing_pool, run_password_job, ACCESS_TOKEN_EXPIRE_MINUTES, USERS_FILE
 )
+from weather import WeatherError, weather_from_env
+from intents import classify
+from plans import PlanEngine
 
 # Load environment variables
 load_dotenv()
@@ -30,9 +32,8 @@ if not api_key:
 # Initialize Cohere client
 co = cohere.Client(api_key)
 
-# Weather API configuration
-WEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
-WEATHER_BASE_URL = "http://api.openweathermap.org/data/2.5/weather"
+# Weather provider (OpenWeatherMap, or WEATHER_PROVIDER=stub offline) behind a per-cell cache
+weather_cache = weather_from_env()
 
 app = FastAPI()
 
@@ -75,6 +76,8 @@ EXERCISE_CATEGORIES = {
     ]
 }
 
+plan_engine = PlanEngine(EXERCISE_CATEGORIES)
+
 # Exercise endpoints
 @app.get("/api/exercises/categories")
 async def get_exercise_categories():
@@ -98,20 +101,19 @@ async def get_exercise_data(exercise_name: str):
 # Authentication endpoints
 @app.post("/api/signup", response_model=Token)
 async def signup(form_data: OAuth2PasswordRequestForm = Depends()):
-    users = get_users()
-    if form_data.username in users:
+    if user_store.get_user(form_data.username) is not None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already registered"
         )
     
-    hashed_password = get_password_hash(form_data.password)
-    users[form_data.username] = {
-        "username": form_data.username,
-        "hashed_password": hashed_password,
-        "disabled": False
-    }
-    save_users(users)
+    hashed_password = await run_password_job(get_password_hash, form_data.password)
+    # create_user is atomic, so a concurrent signup for the same name still fails cleanly
+    if not user_store.create_user(form_data.username, hashed_password):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username already registered"
+        )
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -121,7 +123,7 @@ async def signup(form_data: OAuth2PasswordRequestForm = Depends()):
 
 @app.post("/api/login", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await run_password_job(authenticate_user, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -134,32 +136,34 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
-# Profile endpoints
-PROFILES_FILE = "profiles.json"
+@app.get("/api/metrics/password-hashing")
+async def password_hashing_metrics():
+    return hashing_pool.metrics()
 
-def get_profiles():
-    if os.path.exists(PROFILES_FILE):
-        with open(PROFILES_FILE, "r") as f:
-            return json.load(f)
-    return {}
+# Profile endpoints
+PROFILES_FILE = "profiles.json"  # Legacy storage, imported into the database once
 
-def save_profiles(profiles):
-    with open(PROFILES_FILE, "w") as f:
-        json.dump(profiles, f)
+@app.on_event("startup")
+def migrate_legacy_json():
+    counts = user_store.migrate_json(USERS_FILE, PROFILES_FILE)
+    if counts["users"] or counts["profiles"]:
+        print(f"Imported {counts['users']} users and {counts['profiles']} profiles from JSON")
+    # Build the plans of users whose plan is missing or outdated
+    result = plan_engine.refresh_all(user_store)
+    if result["users"]:
+        print(f"Built plans for {result['users']} users in {result['seconds']}s")
 
 @app.get("/api/profile")
 async def get_profile(current_user: User = Depends(get_current_active_user)):
-    profiles = get_profiles()
-    return profiles.get(current_user.username, {})
+    return user_store.get_profile(current_user.username) or {}
 
 @app.post("/api/profile")
 async def update_profile(
     profile: UserProfile,
     current_user: User = Depends(get_current_active_user)
 ):
-    profiles = get_profiles()
-    profiles[current_user.username] = profile.dict()
-    save_profiles(profiles)
+    user_store.save_profile(current_user.username, profile.dict())
+    plan_engine.refresh_user(user_store, current_user.username, profile.dict())
     return {"message": "Profile updated successfully"}
 
 # Define chat models
@@ -202,49 +206,14 @@ FITNESS_RESPONSES = {
 }
 
 def get_fitness_response(message: str) -> str:
-    message = message.lower()
-    
-    # Check for general greetings and help
-    if any(word in message for word in ["hi", "hello", "hey"]):
-        return FITNESS_RESPONSES["general"]["hi"]
-    if "help" in message:
-        return FITNESS_RESPONSES["general"]["help"]
-    if any(word in message for word in ["thanks", "thank you"]):
-        return FITNESS_RESPONSES["general"]["thanks"]
-    if any(word in message for word in ["bye", "goodbye"]):
-        return FITNESS_RESPONSES["general"]["bye"]
-    
-    # Check for workout level
-    if any(word in message for word in ["beginner", "start", "new", "first time"]):
-        return FITNESS_RESPONSES["workout"]["beginner"]
-    if "intermediate" in message:
-        return FITNESS_RESPONSES["workout"]["intermediate"]
-    if "advanced" in message:
-        return FITNESS_RESPONSES["workout"]["advanced"]
-    
-    # Check for nutrition goals
-    if any(phrase in message for phrase in ["lose weight", "weight loss", "burn fat", "slim down"]):
-        return FITNESS_RESPONSES["nutrition"]["weight_loss"]
-    if any(phrase in message for phrase in ["gain muscle", "build muscle", "get stronger", "bulk up"]):
-        return FITNESS_RESPONSES["nutrition"]["muscle_gain"]
-    if any(word in message for word in ["maintain", "maintenance", "stay same"]):
-        return FITNESS_RESPONSES["nutrition"]["maintenance"]
-    
-    # Check for form questions
-    if "squat" in message and any(word in message for word in ["form", "how to", "proper", "correct"]):
-        return FITNESS_RESPONSES["form"]["squat"]
-    if "deadlift" in message and any(word in message for word in ["form", "how to", "proper", "correct"]):
-        return FITNESS_RESPONSES["form"]["deadlift"]
-    if any(word in message for word in ["push", "pushup", "push-up"]) and any(word in message for word in ["form", "how to", "proper", "correct"]):
-        return FITNESS_RESPONSES["form"]["pushup"]
-    
-    # Check for motivation
-    if any(word in message for word in ["motivation", "tired", "hard", "difficult", "can't", "cannot", "don't want"]):
-        import random
+    intent = classify(message)
+    if intent is None:
+        # If no specific match, provide a helpful default response
+        return "I can help you with: 1) Workout plans (beginner/intermediate/advanced) 2) Nutrition advice 3) Exercise form 4) Motivation. Just ask about any of these topics!"
+    section, key = intent
+    if section == "motivation":
         return random.choice(FITNESS_RESPONSES["motivation"])
-    
-    # If no specific match, provide a helpful default response
-    return "I can help you with: 1) Workout plans (beginner/intermediate/advanced) 2) Nutrition advice 3) Exercise form 4) Motivation. Just ask about any of these topics!"
+    return FITNESS_RESPONSES[section][key]
 
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(message: ChatMessage):
@@ -284,37 +253,19 @@ class WeatherResponse(BaseModel):
 @app.get("/api/weather", response_model=WeatherResponse)
 async def get_weather(lat: float, lon: float):
     try:
-        # Get current time
-        current_time = datetime.now().strftime("%I:%M %p")
-        
-        # Get weather data
-        params = {
-            "lat": lat,
-            "lon": lon,
-            "appid": WEATHER_API_KEY,
-            "units": "metric"  # For Celsius
-        }
-        
-        response = requests.get(WEATHER_BASE_URL, params=params)
-        data = response.json()
-        
-        # Debug print
-        print("Weather API response:", data)
-        
-        if response.status_code == 200:
-            return WeatherResponse(
-                temperature=round(data["main"]["temp"]),
-                description=data["weather"][0]["description"],
-                icon=data["weather"][0]["icon"],
-                city=data["name"],
-                time=current_time
-            )
-        else:
-            raise HTTPException(status_code=500, detail=f"Weather data not available: {data}")
-            
-    except Exception as e:
+        weather = await weather_cache.get(lat, lon)
+    except WeatherError as e:
         print("Weather fetch error:", str(e))
         raise HTTPException(status_code=500, detail=str(e))
+    return WeatherResponse(**weather, time=datetime.now().strftime("%I:%M %p"))
+
+@app.get("/api/metrics/weather")
+async def weather_metrics():
+    return weather_cache.stats()
+
+@app.on_event("shutdown")
+async def close_weather_client():
+    await weather_cache.close()
 
 class Recommendation(BaseModel):
     day: str
@@ -325,31 +276,8 @@ class Recommendation(BaseModel):
     notes: str = ""
 
 @app.get("/api/recommendations")
-async def get_recommendations(current_user: User = Depends(get_current_active_user)):
-    profiles = get_profiles()
-    profile = profiles.get(current_user.username, {})
-    # Use the first goal as the main category, fallback to 'Upper Body'
-    category = (profile.get('goals') or ['Upper Body'])[0]
-    # Map common goal names to categories
-    category_map = {
-        'Weight Loss': 'Full Body',
-        'Muscle Gain': 'Upper Body',
-        'Endurance': 'Lower Body',
-        'Flexibility': 'Core',
-        'General Fitness': 'Full Body',
-    }
-    category = category_map.get(category, category)
-    exercises = EXERCISE_CATEGORIES.get(category, EXERCISE_CATEGORIES['Upper Body'])
-    # Generate a 7-day plan, rotating through exercises
-    plan = []
-    for i in range(7):
-        exercise = exercises[i % len(exercises)]
-        plan.append({
-            'day': f'Day {i+1}',
-            'exercise': exercise,
-            'sets': 3,
-            'reps': 12,
-            'rest_time': 60,
-            'notes': f'Focus on form and control for {exercise.replace("_", " ")}.'
-        })
-    return plan
+async def get_recommendations(week: int = 1, current_user: User = Depends(get_current_active_user)):
+    plan = plan_engine.get(user_store, current_user.username)
+    if not 1 <= week <= len(plan):
+        raise HTTPException(status_code=400, detail=f"week must be between 1 and {len(plan)}")
+    return plan[week - 1]
@@ -0,0 +1,143 @@
+"""
+Precomputed weekly training plans.
+A plan depends only on a user's main category and experience level, so plans
+are built once per (category, experience) class and handed to every user in
+it. The results are stored per user, which turns GET /api/recommendations
+into a single keyed read; a profile update recomputes just that user's plan.
+"""
+
+import json
+import time
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Bump when the plan layout or prescriptions change; outdated stored plans are rebuilt
+PLAN_VERSION = 1
+
+# Goals named in the profile form, mapped to exercise categories
+GOAL_CATEGORIES = {
+    'Weight Loss': 'Full Body',
+    'Muscle Gain': 'Upper Body',
+    'Endurance': 'Lower Body',
+    'Flexibility': 'Core',
+    'General Fitness': 'Full Body',
+}
+
+# Experience level -> (sets, reps in week 1, rest seconds)
+PRESCRIPTIONS = {
+    'Beginner': (3, 12, 60),
+    'Intermediate': (4, 10, 75),
+    'Advanced': (5, 8, 90),
+}
+DEFAULT_CATEGORY = 'Upper Body'
+DEFAULT_EXPERIENCE = 'Beginner'
+
+PlanKey = Tuple[str, str]
+
+class PlanEngine:
+    def __init__(self, categories: Dict[str, List[str]], weeks: int = 4, days_per_week: int = 7):
+        """
+        Args:
+            categories: Category name -> exercises rotated through
+            weeks (int): Weeks per plan; reps go up by one each week
+            days_per_week (int): Training days per week
+        """
+        self.categories = categories
+        self.weeks = weeks
+        self.days_per_week = days_per_week
+
+    def plan_key(self, profile: Optional[Dict]) -> PlanKey:
+        """(category, experience) class of a profile"""
+        profile = profile or {}
+        # Use the first goal as the main category
+        category = (profile.get('goals') or [DEFAULT_CATEGORY])[0]
+        category = GOAL_CATEGORIES.get(category, category)
+        if category not in self.categories:
+            category = DEFAULT_CATEGORY
+        experience = profile.get('experience') or DEFAULT_EXPERIENCE
+        experience = experience.capitalize()
+        if experience not in PRESCRIPTIONS:
+            experience = DEFAULT_EXPERIENCE
+        return category, experience
+
+    def build(self, key: PlanKey) -> List[List[Dict]]:
+        """
+        Plan of one class.
+
+        Returns:
+            List[List[Dict]]: One list of daily entries per week
+        """
+        category, experience = key
+        exercises = self.categories[category]
+        sets, reps, rest_time = PRESCRIPTIONS[experience]
+
+        # Exercise rotation and rep progression for every day of every week at once
+        days = np.arange(self.weeks * self.days_per_week)
+        exercise_index = days % len(exercises)
+        day_reps = reps + days // self.days_per_week
+
+        plan = [[] for _ in range(self.weeks)]
+        for day, index, n_reps in zip(days.tolist(), exercise_index.tolist(), day_reps.tolist()):
+            exercise = exercises[index]
+            plan[day // self.days_per_week].append({
+                'day': f'Day {day % self.days_per_week + 1}',
+                'exercise': exercise,
+                'sets': sets,
+                'reps': n_reps,
+                'rest_time': rest_time,
+                'notes': f'Focus on form and control for {exercise.replace("_", " ")}.'
+            })
+        return plan
+
+    def build_many(self, profiles: Iterable[Tuple[str, Optional[Dict]]]) -> Dict[str, str]:
+        """
+        Plans for many users, built and serialized once per class.
+
+        Args:
+            profiles: (username, profile) pairs
+
+        Returns:
+            Dict[str, str]: username -> plan as JSON
+        """
+        serialized: Dict[PlanKey, str] = {}
+        plans = {}
+        for username, profile in profiles:
+            key = self.plan_key(profile)
+            if key not in serialized:
+                serialized[key] = json.dumps(self.build(key))
+            plans[username] = serialized[key]
+        return plans
+
+    def refresh_user(self, store, username: str, profile: Optional[Dict]) -> List[List[Dict]]:
+        """Recompute and store one user's plan, e.g. after a profile update"""
+        plan_json = self.build_many([(username, profile)])[username]
+        store.save_plans({username: plan_json}, PLAN_VERSION)
+        return json.loads(plan_json)
+
+    def refresh_all(self, store, only_outdated: bool = True) -> Dict:
+        """
+        Rebuild the stored plans of every user with a profile.
+
+        Args:
+            store: UserStore holding profiles and plans
+            only_outdated (bool): Skip users whose plan is already at PLAN_VERSION
+
+        Returns:
+            Dict: Users updated, classes built and seconds taken
+        """
+        start = time.perf_counter()
+        profiles = store.iter_profiles(stale_plan_version=PLAN_VERSION if only_outdated else None)
+        plans = self.build_many(profiles)
+        store.save_plans(plans, PLAN_VERSION)
+        return {
+            "users": len(plans),
+            "classes": len(set(plans.values())),
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+
+    def get(self, store, username: str) -> List[List[Dict]]:
+        """Stored plan of a user, computed on the spot if it is missing or outdated"""
+        plan = store.get_plan(username, PLAN_VERSION)
+        if plan is None:
+            plan = self.refresh_user(store, username, store.get_profile(username))
+        return plan
@@ -0,0 +1,210 @@
+"""
+SQLite-backed store for user accounts, profiles and precomputed plans.
+Replaces the users.json/profiles.json files, which were parsed in full on every
+authenticated request and rewritten in full on every change. Lookups go
+through the primary-key index and every write touches a single row.
+
+Usage (one-shot migration of the old JSON files, from the backend directory):
+    python user_store.py --db users.db --users users.json --profiles profiles.json
+"""
+
+import argparse
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    hashed_password TEXT NOT NULL,
+    disabled INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS profiles (
+    username TEXT PRIMARY KEY,
+    profile TEXT NOT NULL,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS plans (
+    username TEXT PRIMARY KEY,
+    plan TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS migrations (
+    source TEXT PRIMARY KEY,
+    migrated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+class UserStore:
+    def __init__(self, db_path="users.db", timeout: float = 30.0):
+        """
+        Open (and create if needed) the store.
+
+        Args:
+            db_path: SQLite database file
+            timeout (float): Seconds a writer waits for another writer's lock
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.timeout = timeout
+        # One connection per thread; sqlite3 connections must not be shared across threads
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout)
+            conn.row_factory = sqlite3.Row
+            # WAL lets readers proceed while a write is in progress
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_user(self, username: str) -> Optional[Dict]:
+        """
+        Look up one account.
+
+        Returns:
+            Optional[Dict]: username, hashed_password and disabled, or None if there is no such user
+        """
+        row = self._connection().execute(
+            "SELECT username, hashed_password, disabled FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"username": row["username"], "hashed_password": row["hashed_password"], "disabled": bool(row["disabled"])}
+
+    def create_user(self, username: str, hashed_password: str, disabled: bool = False) -> bool:
+        """
+        Add an account unless the username is taken. The check and the insert are one statement,
+        so two concurrent signups for the same name cannot both succeed.
+
+        Returns:
+            bool: True if the account was created
+        """
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "INSERT INTO users (username, hashed_password, disabled) VALUES (?, ?, ?) "
+                "ON CONFLICT(username) DO NOTHING",
+                (username, hashed_password, int(disabled))
+            )
+        return cursor.rowcount == 1
+
+    def get_profile(self, username: str) -> Optional[Dict]:
+        """Return a user's profile, or None if none was saved"""
+        row = self._connection().execute(
+            "SELECT profile FROM profiles WHERE username = ?", (username,)
+        ).fetchone()
+        return json.loads(row["profile"]) if row else None
+
+    def save_profile(self, username: str, profile: Dict) -> None:
+        """Insert or replace a user's profile"""
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO profiles (username, profile) VALUES (?, ?) "
+                "ON CONFLICT(username) DO UPDATE SET profile = excluded.profile, updated_at = CURRENT_TIMESTAMP",
+                (username, json.dumps(profile))
+            )
+
+    def iter_profiles(self, stale_plan_version: Optional[int] = None) -> List[Tuple[str, Dict]]:
+        """
+        All saved profiles as (username, profile) pairs.
+
+        Args:
+            stale_plan_version (int): If given, only users without a stored plan of this version
+        """
+        if stale_plan_version is None:
+            rows = self._connection().execute("SELECT username, profile FROM profiles")
+        else:
+            rows = self._connection().execute(
+                "SELECT profiles.username, profiles.profile FROM profiles "
+                "LEFT JOIN plans ON plans.username = profiles.username "
+                "WHERE plans.version IS NULL OR plans.version != ?", (stale_plan_version,)
+            )
+        return [(row["username"], json.loads(row["profile"])) for row in rows]
+
+    def get_plan(self, username: str, version: int) -> Optional[List]:
+        """Return a user's stored plan, or None if there is none of this version"""
+        row = self._connection().execute(
+            "SELECT plan FROM plans WHERE username = ? AND version = ?", (username, version)
+        ).fetchone()
+        return json.loads(row["plan"]) if row else None
+
+    def save_plans(self, plans: Dict[str, str], version: int) -> None:
+        """
+        Insert or replace plans in one transaction.
+
+        Args:
+            plans: username -> plan already serialized as JSON
+            version (int): Plan format version stored alongside
+        """
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT INTO plans (username, plan, version) VALUES (?, ?, ?) "
+                "ON CONFLICT(username) DO UPDATE SET plan = excluded.plan, version = excluded.version, "
+                "updated_at = CURRENT_TIMESTAMP",
+                ((username, plan, version) for username, plan in plans.items())
+            )
+
+    def migrate_json(self, users_file=None, profiles_file=None) -> Dict[str, int]:
+        """
+        Import the old JSON files once; files already imported are skipped.
+
+        Accepts both user file layouts in use:
+        {"name": {"username", "hashed_password", "disabled"}} and
+        {"name": {"password", "profile"}}. Rows already in the database win
+        over the JSON contents.
+
+        Returns:
+            Dict[str, int]: Number of users and profiles imported
+        """
+        counts = {"users": 0, "profiles": 0}
+        for kind, path in (("users", users_file), ("profiles", profiles_file)):
+            if path is None or not Path(path).exists():
+                continue
+            source = str(Path(path).resolve())
+            with open(path, "r") as f:
+                data = json.load(f)
+
+            with self._connection() as conn:
+                claimed = conn.execute(
+                    "INSERT INTO migrations (source) VALUES (?) ON CONFLICT(source) DO NOTHING", (source,)
+                ).rowcount
+                if not claimed:
+                    continue
+                if kind == "users":
+                    users = [
+                        (name, record.get("hashed_password") or record["password"], int(bool(record.get("disabled"))))
+                        for name, record in data.items()
+                    ]
+                    profiles = [(name, json.dumps(record["profile"])) for name, record in data.items() if record.get("profile")]
+                    counts["users"] += conn.executemany(
+                        "INSERT INTO users (username, hashed_password, disabled) VALUES (?, ?, ?) "
+                        "ON CONFLICT(username) DO NOTHING", users
+                    ).rowcount
+                else:
+                    profiles = [(name, json.dumps(profile)) for name, profile in data.items()]
+                counts["profiles"] += conn.executemany(
+                    "INSERT INTO profiles (username, profile) VALUES (?, ?) ON CONFLICT(username) DO NOTHING", profiles
+                ).rowcount
+        return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Import users.json/profiles.json into the SQLite user store")
+    parser.add_argument("--db", default="users.db", help="SQLite database file")
+    parser.add_argument("--users", default=None, help="users.json to import")
+    parser.add_argument("--profiles", default=None, help="profiles.json to import")
+    args = parser.parse_args()
+
+    counts = UserStore(args.db).migrate_json(args.users, args.profiles)
+    print(f"Imported {counts['users']} users and {counts['profiles']} profiles into {args.db}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Weather lookups for the dashboard widget.
+Upstream calls go through one pooled async HTTP client. Results are cached per
+map cell (lat/lon rounded to a grid), and concurrent requests for the same cell
+share a single upstream fetch. Once a cached entry goes stale it is still served
+while a background refresh runs, so a slow provider never holds up the page.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+class WeatherError(Exception):
+    """Raised when the provider cannot deliver weather for a location"""
+
+class OpenWeatherProvider:
+    def __init__(self, api_key: Optional[str], base_url: str = "http://api.openweathermap.org/data/2.5/weather",
+                 timeout: float = 5.0):
+        """
+        Args:
+            api_key (str): OpenWeatherMap API key
+            base_url (str): Current-weather endpoint
+            timeout (float): Seconds before an upstream request is abandoned
+        """
+        self.api_key = api_key
+        self.base_url = base_url
+        # Keep-alive pool shared by every request
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+        )
+
+    async def fetch(self, lat: float, lon: float) -> Dict:
+        """Current conditions as {temperature, description, icon, city}"""
+        params = {"lat": lat, "lon": lon, "appid": self.api_key, "units": "metric"}
+        try:
+            response = await self._client.get(self.base_url, params=params)
+        except httpx.HTTPError as e:
+            raise WeatherError(f"Weather provider unreachable: {e}") from e
+        if response.status_code != 200:
+            raise WeatherError(f"Weather data not available: {response.text}")
+        data = response.json()
+        return {
+            "temperature": round(data["main"]["temp"]),
+            "description": data["weather"][0]["description"],
+            "icon": data["weather"][0]["icon"],
+            "city": data["name"],
+        }
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+class StubWeatherProvider:
+    def __init__(self, delay: float = 0.0):
+        """
+        Offline provider returning made-up but location-dependent weather.
+
+        Args:
+            delay (float): Seconds each fetch takes, to simulate a slow upstream
+        """
+        self.delay = delay
+        self.calls = 0
+
+    async def fetch(self, lat: float, lon: float) -> Dict:
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return {
+            "temperature": round(25 - abs(lat) / 3),
+            "description": "clear sky",
+            "icon": "01d",
+            "city": f"Stub {lat:.2f},{lon:.2f}",
+        }
+
+    async def close(self) -> None:
+        pass
+
+class WeatherCache:
+    def __init__(self, provider, ttl: float = 600, stale_ttl: float = 3600,
+                 precision: int = 2, max_entries: int = 10000):
+        """
+        Args:
+            provider: Object with `async fetch(lat, lon)` and `async close()`
+            ttl (float): Seconds an entry is served without refreshing
+            stale_ttl (float): Seconds an entry may still be served while it is refreshed
+            precision (int): Decimal places lat/lon are rounded to (2 is about 1 km)
+            max_entries (int): Cells kept; the least recently used are dropped first
+        """
+        self.provider = provider
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.precision = precision
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[float, float], Tuple[float, Dict]]" = OrderedDict()
+        self._inflight: Dict[Tuple[float, float], asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.fetches = 0
+
+    def cell(self, lat: float, lon: float) -> Tuple[float, float]:
+        return round(lat, self.precision), round(lon, self.precision)
+
+    async def get(self, lat: float, lon: float) -> Dict:
+        """
+        Weather for the cell containing (lat, lon).
+
+        Raises:
+            WeatherError: If nothing usable is cached and the provider fails
+        """
+        key = self.cell(lat, lon)
+        entry = self._entries.get(key)
+        if entry is not None:
+            fetched_at, weather = entry
+            age = time.monotonic() - fetched_at
+            if age < self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return weather
+            if age < self.stale_ttl:
+                # Serve the stale copy now and refresh behind it
+                self.stale_hits += 1
+                self._entries.move_to_end(key)
+                self._refresh(key)
+                return weather
+
+        self.misses += 1
+        return await asyncio.shield(self._refresh(key))
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "fetches": self.fetches,
+        }
+
+    def _refresh(self, key: Tuple[float, float]) -> asyncio.Task:
+        """Start a fetch for the cell, or join the one already running"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key))
+            self._inflight[key] = task
+            # Mark the error of a background refresh as retrieved; callers awaiting the task still see it
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def _fetch(self, key: Tuple[float, float]) -> Dict:
+        self.fetches += 1
+        try:
+            weather = await self.provider.fetch(*key)
+        except WeatherError:
+            raise
+        except Exception as e:
+            raise WeatherError(str(e)) from e
+        finally:
+            self._inflight.pop(key, None)
+        self._entries[key] = (time.monotonic(), weather)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return weather
+
+    async def close(self) -> None:
+        await self.provider.close()
+
+def weather_from_env() -> WeatherCache:
+    """Build the cache from WEATHER_PROVIDER ("openweather" or "stub") and related settings"""
+    if os.getenv("WEATHER_PROVIDER", "openweather") == "stub":
+        provider = StubWeatherProvider(delay=float(os.getenv("WEATHER_STUB_DELAY", 0)))
+    else:
+        provider = OpenWeatherProvider(
+            os.getenv("OPENWEATHER_API_KEY"),
+            timeout=float(os.getenv("WEATHER_TIMEOUT", 5)),
+        )
+    return WeatherCache(
+        provider,
+        ttl=float(os.getenv("WEATHER_CACHE_TTL", 600)),
+        stale_ttl=float(os.getenv("WEATHER_STALE_TTL", 3600)),
+    )
@@ -1,21 +1,51 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, WebSocket, WebSocketDisconnect, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import Dict, Iterator, List, Optional
+import numpy as np
 import pandas as pd
 from pathlib import Path
-import re
 from .data_processor import ExerciseDataProcessor
+from .downsampling import downsample, select_time_range
+from .csv_cache import read_csv_cached
+from .exercise_catalog import ExerciseCatalog
 from .recommender import WorkoutRecommender
+from .recommendation_cache import RecommendationCache
+from .build_index import DEFAULT_INDEX_DIR
+from .preprocess_all import sensor_pyramid
+from .live_session import LiveSession, parse_samples
+from .user_store import UserStore
 import json
 import os
+import time
 from datetime import datetime, timedelta
 
 app = FastAPI()
 
+# Prebuilt recommender index (see src/build_index.py), loaded once at startup
+RECOMMENDER_INDEX_DIR = Path(os.getenv("RECOMMENDER_INDEX_DIR", str(DEFAULT_INDEX_DIR)))
+recommender: Optional[WorkoutRecommender] = None
+recommendation_cache: Optional[RecommendationCache] = None
+
+@app.on_event("startup")
+def load_recommender():
+    global recommender, recommendation_cache
+    if (RECOMMENDER_INDEX_DIR / "index.json").exists():
+        recommender = WorkoutRecommender.load(RECOMMENDER_INDEX_DIR)
+        recommendation_cache = RecommendationCache(
+            recommender,
+            max_size=int(os.getenv("RECOMMENDATION_CACHE_SIZE", "1024")),
+            ttl=float(os.getenv("RECOMMENDATION_CACHE_TTL", "300"))
+        )
+    else:
+        print(f"WARNING: No recommender index found at {RECOMMENDER_INDEX_DIR}. Run python -m src.build_index first.")
+
 # Enable CORS
 app.add_middleware(
     CORSMiddleware,
@@ -35,6 +65,14 @@ class UserProfile(BaseModel):
     experience: str
     medical_conditions: Optional[str] = None
 
+# Upper bounds on the work one recommendation request may ask for
+MAX_RECOMMENDATIONS = 50
+MAX_BATCH_PROFILES = 1000
+
+class BatchRecommendationRequest(BaseModel):
+    profiles: List[UserProfile]
+    n_recommendations: int = Field(5, ge=1, le=MAX_RECOMMENDATIONS)
+
 class ExerciseData(BaseModel):
     name: str
     category: str
@@ -69,35 +107,22 @@ EXERCISE_CATEGORIES = {
     ]
 }
 
+# Catalog of the raw recordings, rescanned only when the directory changes
+exercise_catalog = ExerciseCatalog("data/raw/MetaMotion")
+
 def get_available_exercises():
     """Get list of available exercises from the data directory"""
-    data_dir = Path("data/raw/MetaMotion")
-    exercises = set()
-    
-    for file in data_dir.glob("*.csv"):
-        match = re.search(r'[A-Z]-([a-z]+)-', file.name)
-        if match:
-            exercise = match.group(1)
-            exercises.add(exercise)
-    
-    return sorted(list(exercises))
+    return exercise_catalog.exercises()
 
 def load_exercise_data(exercise_name: str):
     """Load both accelerometer and gyroscope data for a given exercise"""
-    data_dir = Path("data/raw/MetaMotion")
-    exercise_files = list(data_dir.glob(f"*{exercise_name}*.csv"))
-    
-    if not exercise_files:
-        return None, None
+    accel_file, gyro_file = exercise_catalog.latest_pair(exercise_name)
     
-    accel_files = [f for f in exercise_files if "Accelerometer" in f.name]
-    gyro_files = [f for f in exercise_files if "Gyroscope" in f.name]
-    
-    if not accel_files or not gyro_files:
+    if accel_file is None or gyro_file is None:
         return None, None
     
-    accel_data = pd.read_csv(accel_files[-1])
-    gyro_data = pd.read_csv(gyro_files[-1])
+    accel_data = read_csv_cached(accel_file)
+    gyro_data = read_csv_cached(gyro_file)
     
     return accel_data, gyro_data
 
@@ -111,43 +136,210 @@ async def get_available_exercises_endpoint():
     """Get list of available exercises"""
     return get_available_exercises()
 
+# Rows serialized per chunk when streaming exercise data
+STREAM_CHUNK_ROWS = 5000
+
+def _ndjson_stream(sensors: Dict[str, pd.DataFrame]) -> Iterator[str]:
+    """Yield one JSON object per sample, tagged with its sensor"""
+    for sensor, df in sensors.items():
+        for start in range(0, len(df), STREAM_CHUNK_ROWS):
+            chunk = df.iloc[start:start + STREAM_CHUNK_ROWS].assign(sensor=sensor)
+            yield chunk.to_json(orient="records", lines=True).rstrip("\n") + "\n"
+
+def _columnar_stream(sensors: Dict[str, pd.DataFrame]) -> Iterator[bytes]:
+    """
+    Yield the sensors as raw little-endian column buffers.
+
+    Layout: a uint32 header length, a JSON header listing every sensor's
+    columns (name, dtype, length and, for categorical columns, the categories
+    the integer codes refer to), then each column's buffer in header order.
+    """
+    header = {}
+    buffers = []
+    for sensor, df in sensors.items():
+        columns = []
+        for name in df.columns:
+            values = df[name]
+            column = {"name": name}
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                column["categories"] = values.cat.categories.astype(str).tolist()
+                values = values.cat.codes
+            elif hasattr(values.dtype, "numpy_dtype"):
+                # Nullable numbers (e.g. an Int64 epoch with gaps) are sent as NumPy values, gaps as NaN
+                dtype = values.dtype.numpy_dtype
+                if values.hasnans:
+                    dtype = np.result_type(dtype, np.float64)
+                values = pd.Series(values.to_numpy(dtype=dtype, na_value=np.nan))
+            elif values.dtype == object or isinstance(values.dtype, pd.api.extensions.ExtensionDtype):
+                codes, categories = pd.factorize(values)
+                column["categories"] = categories.astype(str).tolist()
+                values = pd.Series(codes)
+            array = np.ascontiguousarray(values.to_numpy()).astype(values.dtype.newbyteorder("<"), copy=False)
+            column["dtype"] = array.dtype.str
+            column["length"] = len(array)
+            columns.append(column)
+            buffers.append(array)
+        header[sensor] = columns
+
+    encoded = json.dumps(header).encode()
+    yield len(encoded).to_bytes(4, "little") + encoded
+    for array in buffers:
+        yield array.tobytes()
+
 @app.get("/api/exercises/{exercise_name}")
-async def get_exercise_data(exercise_name: str):
-    """Get exercise data for a specific exercise"""
-    accel_data, gyro_data = load_exercise_data(exercise_name)
-    
-    if accel_data is None or gyro_data is None:
-        raise HTTPException(status_code=404, detail="Exercise data not found")
-    
-    # Process the data
-    processor_accel = ExerciseDataProcessor()
-    processor_accel.raw_data = accel_data
-    processed_accel = processor_accel.preprocess_data()
-    
-    processor_gyro = ExerciseDataProcessor()
-    processor_gyro.raw_data = gyro_data
-    processed_gyro = processor_gyro.preprocess_data()
+async def get_exercise_data(exercise_name: str,
+                            start: Optional[float] = Query(None, description="First elapsed second to return"),
+                            end: Optional[float] = Query(None, description="Last elapsed second to return"),
+                            width: Optional[int] = Query(None, ge=1, description="Plot width in pixels; serves the matching level of detail"),
+                            max_points: Optional[int] = Query(None, ge=2, description="Downsample each sensor to at most this many samples"),
+                            format: str = Query("json", pattern="^(json|ndjson|columnar)$")):
+    """
+    Get exercise data for a specific exercise.
+
+    The recording can be narrowed to a time range and reduced to max_points
+    samples per sensor with min/max downsampling, which keeps the peaks a plot
+    needs. With width, the rows come from the coarsest level of the
+    precomputed pyramid that still fills that many pixels, so the cost follows
+    the plot size rather than the recording length. "ndjson" and "columnar"
+    stream the result instead of building it as one response body.
+    """
+    if width is not None:
+        accel_file, gyro_file = exercise_catalog.latest_pair(exercise_name)
+        if accel_file is None or gyro_file is None:
+            raise HTTPException(status_code=404, detail="Exercise data not found")
+        sensors = {
+            sensor: downsample(sensor_pyramid(file).query(width, start, end), max_points)
+            for sensor, file in (("accelerometer", accel_file), ("gyroscope", gyro_file))
+        }
+    else:
+        accel_data, gyro_data = load_exercise_data(exercise_name)
+        
+        if accel_data is None or gyro_data is None:
+            raise HTTPException(status_code=404, detail="Exercise data not found")
+        
+        # Process the data
+        sensors = {}
+        for sensor, data in (("accelerometer", accel_data), ("gyroscope", gyro_data)):
+            processor = ExerciseDataProcessor()
+            processor.raw_data = data
+            processed = select_time_range(processor.preprocess_data(), start, end)
+            sensors[sensor] = downsample(processed, max_points)
     
-    return {
-        "accelerometer": processed_accel.to_dict(orient="records"),
-        "gyroscope": processed_gyro.to_dict(orient="records")
-    }
+    if format == "ndjson":
+        return StreamingResponse(_ndjson_stream(sensors), media_type="application/x-ndjson")
+    if format == "columnar":
+        return StreamingResponse(_columnar_stream(sensors), media_type="application/octet-stream")
+    return {sensor: df.to_dict(orient="records") for sensor, df in sensors.items()}
 
+# Scoring is CPU-bound, so the recommendation endpoints are plain functions that
+# FastAPI runs in its threadpool, keeping the event loop free for /ws/ingest
 @app.post("/api/recommendations")
-async def get_recommendations(profile: UserProfile):
+def get_recommendations(profile: UserProfile):
     """Get workout recommendations based on user profile"""
-    recommender = WorkoutRecommender()
-    recommendations = recommender.get_recommendations(
-        weight=profile.weight,
-        height=profile.height,
-        age=profile.age,
-        gender=profile.gender,
-        goals=profile.goals,
-        experience=profile.experience,
-        medical_conditions=profile.medical_conditions
-    )
+    if recommender is None:
+        raise HTTPException(status_code=503, detail="Recommender index not loaded")
+    recommendations = recommendation_cache.get_recommendations(profile.dict())
     return recommendations
 
+@app.post("/api/recommendations/batch")
+def get_recommendations_batch(request: BatchRecommendationRequest):
+    """Get workout recommendations for many user profiles in one call"""
+    if recommender is None:
+        raise HTTPException(status_code=503, detail="Recommender index not loaded")
+    if len(request.profiles) > MAX_BATCH_PROFILES:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_BATCH_PROFILES} profiles per batch")
+    return recommendation_cache.get_recommendations_batch(
+        [profile.dict() for profile in request.profiles],
+        n_recommendations=request.n_recommendations
+    )
+
+@app.get("/api/recommendations/cache")
+async def get_recommendation_cache_stats():
+    """Get hit/miss counters for the recommendation cache"""
+    if recommendation_cache is None:
+        raise HTTPException(status_code=503, detail="Recommender index not loaded")
+    return recommendation_cache.stats()
+
+# Live sessions streaming over /ws/ingest, by session id
+LIVE_PUSH_INTERVAL = float(os.getenv("LIVE_PUSH_INTERVAL", "2.0"))
+LIVE_BUFFER_CAPACITY = int(os.getenv("LIVE_BUFFER_CAPACITY", "1024"))
+live_sessions: Dict[str, LiveSession] = {}
+
+@app.websocket("/ws/ingest/{session_id}")
+async def ingest_live_session(websocket: WebSocket, session_id: str,
+                              push_interval: float = LIVE_PUSH_INTERVAL,
+                              n_recommendations: int = Query(5, ge=1, le=MAX_RECOMMENDATIONS)):
+    """
+    Stream sensor samples in and get live updates back.
+
+    Client messages (JSON):
+        {"type": "profile", "profile": {...}}  -- optional, personalizes the recommendations
+        {"type": "samples", "sensor": "accelerometer" | "gyroscope", "samples": [[elapsed, x, y, z], ...]}
+        {"type": "flush"}  -- asks for an update right away
+
+    Every push_interval seconds with new data, the server sends
+    {"type": "update", "stats": ..., "reps": ..., "recommendations": ...}.
+    Malformed messages get {"type": "error", "detail": ...} and are skipped.
+    """
+    await websocket.accept()
+    session = LiveSession(session_id, capacity=LIVE_BUFFER_CAPACITY)
+    live_sessions[session_id] = session
+    profile = {}
+    last_push = time.monotonic()
+    pending = False
+    try:
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            try:
+                # Parse here rather than with receive_json, so bad frames are answered instead of ending the session
+                message = json.loads(frame.get("text") or frame.get("bytes") or "")
+                if not isinstance(message, dict):
+                    raise ValueError("Messages must be JSON objects")
+                if message.get("type") == "profile":
+                    profile = UserProfile(**message.get("profile", {})).dict()
+                    continue
+                flush = message.get("type") == "flush"
+                if not flush:
+                    if message.get("type") != "samples":
+                        raise ValueError(f"Unknown message type: {message.get('type')}")
+                    session.add_samples(message.get("sensor"), parse_samples(message.get("samples")))
+                    pending = True
+            except (ValueError, TypeError, ValidationError) as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+
+            now = time.monotonic()
+            if flush or (pending and now - last_push >= push_interval):
+                await websocket.send_json(await run_in_threadpool(
+                    _live_update, session, profile, n_recommendations))
+                last_push, pending = now, False
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if live_sessions.get(session_id) is session:
+            del live_sessions[session_id]
+
+def _live_update(session: LiveSession, profile: Dict, n_recommendations: int) -> Dict:
+    """Build the update pushed to a live session"""
+    features = session.features()
+    update = {
+        "type": "update",
+        "stats": session.stats(),
+        "reps": {name: features[name] for name in session.rep_counter.features()},
+        "recommendations": None,
+    }
+    if recommendation_cache is not None and session.windows:
+        update["recommendations"] = recommendation_cache.get_recommendations(
+            {**profile, **features}, n_recommendations=n_recommendations)
+    return update
+
+@app.get("/api/live/sessions")
+async def get_live_sessions():
+    """List the sessions currently streaming"""
+    return [session.stats() for session in list(live_sessions.values())]
+
 # Create data directory if it doesn't exist
 DATA_DIR = Path("data")
 PROFILE_FILE = DATA_DIR / "user_profile.json"
@@ -184,18 +376,14 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/login")
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-USERS_FILE = Path("data/users.json")
-USERS_FILE.parent.mkdir(exist_ok=True)
-
-def load_users():
-    if USERS_FILE.exists():
-        with open(USERS_FILE, "r") as f:
-            return json.load(f)
-    return {}
+USERS_FILE = Path("data/users.json")  # Legacy storage, imported into the database once
+user_store = UserStore(os.getenv("USERS_DB", str(DATA_DIR / "users.db")))
 
-def save_users(users):
-    with open(USERS_FILE, "w") as f:
-        json.dump(users, f)
+@app.on_event("startup")
+def migrate_legacy_users():
+    counts = user_store.migrate_json(users_file=USERS_FILE)
+    if counts["users"]:
+        print(f"Imported {counts['users']} users and {counts['profiles']} profiles from {USERS_FILE}")
 
 class User(BaseModel):
     username: str
@@ -228,8 +416,7 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
         username: str = payload.get("sub")
         if username is None:
             raise HTTPException(status_code=401, detail="Invalid credentials")
-        users = load_users()
-        if username not in users:
+        if user_store.get_user(username) is None:
             raise HTTPException(status_code=401, detail="User not found")
         return username
     except JWTError:
@@ -237,38 +424,30 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
 
 @app.post("/api/signup")
 def signup(user: User):
-    users = load_users()
-    if user.username in users:
+    if user_store.get_user(user.username) is not None:
+        raise HTTPException(status_code=400, detail="Username already exists")
+    if not user_store.create_user(user.username, get_password_hash(user.password)):
         raise HTTPException(status_code=400, detail="Username already exists")
-    users[user.username] = {
-        "password": get_password_hash(user.password),
-        "profile": None
-    }
-    save_users(users)
     return {"message": "User created successfully"}
 
 @app.post("/api/login")
 def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    users = load_users()
-    user = users.get(form_data.username)
-    if not user or not verify_password(form_data.password, user["password"]):
+    user = user_store.get_user(form_data.username)
+    if not user or not verify_password(form_data.password, user["hashed_password"]):
         raise HTTPException(status_code=401, detail="Incorrect username or password")
     access_token = create_access_token(data={"sub": form_data.username}, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.get("/api/profile")
 def get_profile(current_user: str = Depends(get_current_user)):
-    users = load_users()
-    profile = users[current_user].get("profile")
+    profile = user_store.get_profile(current_user)
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     return profile
 
 @app.post("/api/profile")
 def set_profile(profile: Profile, current_user: str = Depends(get_current_user)):
-    users = load_users()
-    users[current_user]["profile"] = profile.dict()
-    save_users(users)
+    user_store.save_profile(current_user, profile.dict())
     return {"message": "Profile saved successfully"}
 
 if __name__ == '__main__':
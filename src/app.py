@@ -1,12 +1,15 @@
 import streamlit as st
-import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
-import re
 import os
 from pathlib import Path
 from data_processor import ExerciseDataProcessor
+from csv_cache import read_csv_cached
+from exercise_catalog import ExerciseCatalog
 from recommender import WorkoutRecommender
+from build_index import DEFAULT_INDEX_DIR
+from preprocess_all import sensor_pyramid
+from rep_segmentation import RepSegmenter
 
 # Initialize session state for user data
 if 'user_profile' not in st.session_state:
@@ -79,41 +82,38 @@ EXERCISE_CATEGORIES = {
     ]
 }
 
+# Sensor plots are 10 inches wide at 100 dpi
+PLOT_WIDTH_PX = 1000
+
+@st.cache_resource
+def get_exercise_catalog():
+    """Catalog of the raw recordings, shared across reruns and rescanned when the directory changes"""
+    return ExerciseCatalog("data/raw/MetaMotion")
+
 def get_available_exercises():
     """Get list of available exercises from the data directory"""
-    data_dir = Path("data/raw/MetaMotion")
-    exercises = set()
-    
-    for file in data_dir.glob("*.csv"):
-        # Extract exercise name from filename (e.g., "A-bench-heavy2" -> "bench")
-        match = re.search(r'[A-Z]-([a-z]+)-', file.name)
-        if match:
-            exercise = match.group(1)
-            exercises.add(exercise)
-    
-    return sorted(list(exercises))
+    return get_exercise_catalog().exercises()
 
 def load_exercise_data(exercise_name: str):
     """Load both accelerometer and gyroscope data for a given exercise"""
-    data_dir = Path("data/raw/MetaMotion")
-    exercise_files = list(data_dir.glob(f"*{exercise_name}*.csv"))
-    
-    if not exercise_files:
-        return None, None
-    
-    # Find the most recent files for this exercise
-    accel_files = [f for f in exercise_files if "Accelerometer" in f.name]
-    gyro_files = [f for f in exercise_files if "Gyroscope" in f.name]
+    accel_file, gyro_file = get_exercise_catalog().latest_pair(exercise_name)
     
-    if not accel_files or not gyro_files:
+    if accel_file is None or gyro_file is None:
         return None, None
     
-    # Load the most recent files
-    accel_data = pd.read_csv(accel_files[-1])
-    gyro_data = pd.read_csv(gyro_files[-1])
+    accel_data = read_csv_cached(accel_file)
+    gyro_data = read_csv_cached(gyro_file)
     
     return accel_data, gyro_data
 
+@st.cache_resource
+def load_prebuilt_recommender():
+    """Load the prebuilt recommender index once per process, if one has been built"""
+    index_dir = Path(os.getenv("RECOMMENDER_INDEX_DIR", str(DEFAULT_INDEX_DIR)))
+    if (index_dir / "index.json").exists():
+        return WorkoutRecommender.load(index_dir)
+    return None
+
 def collect_user_profile():
     """Collect user profile information"""
     st.subheader("👤 User Profile")
@@ -230,11 +230,21 @@ else:
                 # Visualizations
                 st.subheader("Sensor Data Visualization")
                 
+                # Plots are drawn from the level-of-detail pyramids at the figure's pixel width
+                accel_file, gyro_file = get_exercise_catalog().latest_pair(selected_exercise)
+                accel_pyramid = sensor_pyramid(accel_file)
+                gyro_pyramid = sensor_pyramid(gyro_file)
+                first_second = float(processed_accel['elapsed (s)'].min())
+                last_second = max(float(processed_accel['elapsed (s)'].max()), first_second + 0.1)
+                time_range = st.slider("Time range (s)", first_second, last_second, (first_second, last_second))
+                accel_plot = accel_pyramid.query(PLOT_WIDTH_PX, *time_range)
+                gyro_plot = gyro_pyramid.query(PLOT_WIDTH_PX, *time_range)
+                
                 # Accelerometer visualization
                 fig1, ax1 = plt.subplots(figsize=(10, 4))
                 accel_columns = [col for col in processed_accel.columns if 'axis' in col]
                 for col in accel_columns:
-                    ax1.plot(processed_accel['elapsed (s)'], processed_accel[col], label=col)
+                    ax1.plot(accel_plot['elapsed (s)'], accel_plot[col], label=col)
                 ax1.set_xlabel('Elapsed (s)')
                 ax1.set_ylabel('Acceleration (g)')
                 ax1.set_title('Accelerometer Data')
@@ -245,7 +255,7 @@ else:
                 fig2, ax2 = plt.subplots(figsize=(10, 4))
                 gyro_columns = [col for col in processed_gyro.columns if 'axis' in col]
                 for col in gyro_columns:
-                    ax2.plot(processed_gyro['elapsed (s)'], processed_gyro[col], label=col)
+                    ax2.plot(gyro_plot['elapsed (s)'], gyro_plot[col], label=col)
                 ax2.set_xlabel('Elapsed (s)')
                 ax2.set_ylabel('Angular Velocity (deg/s)')
                 ax2.set_title('Gyroscope Data')
@@ -263,19 +273,26 @@ else:
                 accel_threshold = np.percentile(accel_magnitude, 75)
                 gyro_threshold = np.percentile(gyro_magnitude, 75)
                 
+                # Count reps and sets from the accelerometer magnitude
+                rep_segmenter = RepSegmenter()
+                reps = rep_segmenter.segment([accel_magnitude.to_numpy()])
+                rep_features = rep_segmenter.summarize(reps, 1).iloc[0]
+                
                 # Plot magnitudes with highlighted active periods
                 fig3, (ax3, ax4) = plt.subplots(2, 1, figsize=(10, 8))
                 
                 # Accelerometer activity
-                ax3.plot(processed_accel['elapsed (s)'], accel_magnitude, label='Movement Magnitude')
+                ax3.plot(accel_plot['elapsed (s)'], accel_plot['magnitude'], label='Movement Magnitude')
                 ax3.axhline(y=accel_threshold, color='r', linestyle='--', label='Activity Threshold')
+                ax3.plot(processed_accel['elapsed (s)'].to_numpy()[reps['peak']], accel_magnitude.to_numpy()[reps['peak']],
+                         'kx', label='Detected Reps')
                 ax3.set_xlabel('Elapsed (s)')
                 ax3.set_ylabel('Acceleration Magnitude')
                 ax3.set_title('Accelerometer Activity')
                 ax3.legend()
                 
                 # Gyroscope activity
-                ax4.plot(processed_gyro['elapsed (s)'], gyro_magnitude, label='Movement Magnitude')
+                ax4.plot(gyro_plot['elapsed (s)'], gyro_plot['magnitude'], label='Movement Magnitude')
                 ax4.axhline(y=gyro_threshold, color='r', linestyle='--', label='Activity Threshold')
                 ax4.set_xlabel('Elapsed (s)')
                 ax4.set_ylabel('Angular Velocity Magnitude')
@@ -284,6 +301,11 @@ else:
                 
                 plt.tight_layout()
                 st.pyplot(fig3)
+                
+                col1, col2, col3 = st.columns(3)
+                col1.metric("Reps", int(rep_features['rep_count']))
+                col2.metric("Sets", int(rep_features['set_count']))
+                col3.metric("Cadence (reps/min)", f"{rep_features['cadence_rpm']:.1f}")
 
                 # Get recommendations
                 st.subheader("Personalized Recommendations")
@@ -298,19 +320,30 @@ else:
                     'experience': st.session_state.user_profile['experience']
                 }
                 
-                # Add sensor data preferences
-                for col in accel_columns:
-                    user_preferences[f'accel_{col}'] = float(processed_accel[col].mean())
-                for col in gyro_columns:
-                    user_preferences[f'gyro_{col}'] = float(processed_gyro[col].mean())
+                # Add sensor data preferences from the time-aligned accelerometer + gyroscope table
+                fusion_processor = ExerciseDataProcessor()
+                processed_fused = fusion_processor.fuse_sensor_data(processed_accel, processed_gyro)
+                window_features = fusion_processor.extract_window_features(processed_fused)
+                feature_columns = [col for col in window_features.columns if 'axis' in col or 'magnitude' in col]
+                user_preferences.update(window_features[feature_columns].mean().to_dict())
+                user_preferences.update(rep_features.to_dict())
+                window_features = window_features.assign(**rep_features.to_dict())
 
                 # Run recommender
-                recommender = WorkoutRecommender()
-                recommender.load_data(processed_accel)  # Use accelerometer data as base
+                recommender = load_prebuilt_recommender()
+                if recommender is None:
+                    recommender = WorkoutRecommender()
+                    recommender.load_data(window_features)  # Use the windowed sensor features as base
                 recommendations = recommender.get_recommendations(user_preferences, n_recommendations=5)
 
+                if recommendations['profile_adjustments']:
+                    st.write("**Profile Adjustments:**")
+                    st.json(recommendations['profile_adjustments'])
+                for note in recommendations['personalized_notes']:
+                    st.info(note)
+
                 st.subheader("Top 5 Recommendations")
-                for i, rec in enumerate(recommendations, 1):
+                for i, rec in enumerate(recommendations['recommendations'], 1):
                     st.write(f"**Recommendation {i}:**")
                     st.json(rec)
             else:
@@ -325,36 +358,17 @@ if 'user_profile' not in st.session_state:
 
 def get_available_exercises():
     """Get list of available exercises from the data directory"""
-    data_dir = Path("data/raw/MetaMotion")
-    exercises = set()
-    
-    for file in data_dir.glob("*.csv"):
-        # Extract exercise name from filename (e.g., "A-bench-heavy2" -> "bench")
-        match = re.search(r'[A-Z]-([a-z]+)-', file.name)
-        if match:
-            exercise = match.group(1)
-            exercises.add(exercise)
-    
-    return sorted(list(exercises))
+    return get_exercise_catalog().exercises()
 
 def load_exercise_data(exercise_name: str):
     """Load both accelerometer and gyroscope data for a given exercise"""
-    data_dir = Path("data/raw/MetaMotion")
-    exercise_files = list(data_dir.glob(f"*{exercise_name}*.csv"))
+    accel_file, gyro_file = get_exercise_catalog().latest_pair(exercise_name)
     
-    if not exercise_files:
+    if accel_file is None or gyro_file is None:
         return None, None
     
-    # Find the most recent files for this exercise
-    accel_files = [f for f in exercise_files if "Accelerometer" in f.name]
-    gyro_files = [f for f in exercise_files if "Gyroscope" in f.name]
-    
-    if not accel_files or not gyro_files:
-        return None, None
-    
-    # Load the most recent files
-    accel_data = pd.read_csv(accel_files[-1])
-    gyro_data = pd.read_csv(gyro_files[-1])
+    accel_data = read_csv_cached(accel_file)
+    gyro_data = read_csv_cached(gyro_file)
     
     return accel_data, gyro_data
 
@@ -461,11 +475,21 @@ else:
             # Visualizations
             st.subheader("Sensor Data Visualization")
             
+            # Plots are drawn from the level-of-detail pyramids at the figure's pixel width
+            accel_file, gyro_file = get_exercise_catalog().latest_pair(selected_exercise)
+            accel_pyramid = sensor_pyramid(accel_file)
+            gyro_pyramid = sensor_pyramid(gyro_file)
+            first_second = float(processed_accel['elapsed (s)'].min())
+            last_second = max(float(processed_accel['elapsed (s)'].max()), first_second + 0.1)
+            time_range = st.slider("Time range (s)", first_second, last_second, (first_second, last_second))
+            accel_plot = accel_pyramid.query(PLOT_WIDTH_PX, *time_range)
+            gyro_plot = gyro_pyramid.query(PLOT_WIDTH_PX, *time_range)
+            
             # Accelerometer visualization
             fig1, ax1 = plt.subplots(figsize=(10, 4))
             accel_columns = [col for col in processed_accel.columns if 'axis' in col]
             for col in accel_columns:
-                ax1.plot(processed_accel['elapsed (s)'], processed_accel[col], label=col)
+                ax1.plot(accel_plot['elapsed (s)'], accel_plot[col], label=col)
             ax1.set_xlabel('Elapsed (s)')
             ax1.set_ylabel('Acceleration (g)')
             ax1.set_title('Accelerometer Data')
@@ -476,7 +500,7 @@ else:
             fig2, ax2 = plt.subplots(figsize=(10, 4))
             gyro_columns = [col for col in processed_gyro.columns if 'axis' in col]
             for col in gyro_columns:
-                ax2.plot(processed_gyro['elapsed (s)'], processed_gyro[col], label=col)
+                ax2.plot(gyro_plot['elapsed (s)'], gyro_plot[col], label=col)
             ax2.set_xlabel('Elapsed (s)')
             ax2.set_ylabel('Angular Velocity (deg/s)')
             ax2.set_title('Gyroscope Data')
@@ -494,19 +518,26 @@ else:
             accel_threshold = np.percentile(accel_magnitude, 75)
             gyro_threshold = np.percentile(gyro_magnitude, 75)
             
+            # Count reps and sets from the accelerometer magnitude
+            rep_segmenter = RepSegmenter()
+            reps = rep_segmenter.segment([accel_magnitude.to_numpy()])
+            rep_features = rep_segmenter.summarize(reps, 1).iloc[0]
+            
             # Plot magnitudes with highlighted active periods
             fig3, (ax3, ax4) = plt.subplots(2, 1, figsize=(10, 8))
             
             # Accelerometer activity
-            ax3.plot(processed_accel['elapsed (s)'], accel_magnitude, label='Movement Magnitude')
+            ax3.plot(accel_plot['elapsed (s)'], accel_plot['magnitude'], label='Movement Magnitude')
             ax3.axhline(y=accel_threshold, color='r', linestyle='--', label='Activity Threshold')
+            ax3.plot(processed_accel['elapsed (s)'].to_numpy()[reps['peak']], accel_magnitude.to_numpy()[reps['peak']],
+                     'kx', label='Detected Reps')
             ax3.set_xlabel('Elapsed (s)')
             ax3.set_ylabel('Acceleration Magnitude')
             ax3.set_title('Accelerometer Activity')
             ax3.legend()
             
             # Gyroscope activity
-            ax4.plot(processed_gyro['elapsed (s)'], gyro_magnitude, label='Movement Magnitude')
+            ax4.plot(gyro_plot['elapsed (s)'], gyro_plot['magnitude'], label='Movement Magnitude')
             ax4.axhline(y=gyro_threshold, color='r', linestyle='--', label='Activity Threshold')
             ax4.set_xlabel('Elapsed (s)')
             ax4.set_ylabel('Angular Velocity Magnitude')
@@ -515,6 +546,11 @@ else:
             
             plt.tight_layout()
             st.pyplot(fig3)
+            
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Reps", int(rep_features['rep_count']))
+            col2.metric("Sets", int(rep_features['set_count']))
+            col3.metric("Cadence (reps/min)", f"{rep_features['cadence_rpm']:.1f}")
 
             # Get recommendations
             st.subheader("Personalized Recommendations")
@@ -529,19 +565,30 @@ else:
                 'experience': st.session_state.user_profile['experience']
             }
             
-            # Add sensor data preferences
-            for col in accel_columns:
-                user_preferences[f'accel_{col}'] = float(processed_accel[col].mean())
-            for col in gyro_columns:
-                user_preferences[f'gyro_{col}'] = float(processed_gyro[col].mean())
+            # Add sensor data preferences from the time-aligned accelerometer + gyroscope table
+            fusion_processor = ExerciseDataProcessor()
+            processed_fused = fusion_processor.fuse_sensor_data(processed_accel, processed_gyro)
+            window_features = fusion_processor.extract_window_features(processed_fused)
+            feature_columns = [col for col in window_features.columns if 'axis' in col or 'magnitude' in col]
+            user_preferences.update(window_features[feature_columns].mean().to_dict())
+            user_preferences.update(rep_features.to_dict())
+            window_features = window_features.assign(**rep_features.to_dict())
 
             # Run recommender
-            recommender = WorkoutRecommender()
-            recommender.load_data(processed_accel)  # Use accelerometer data as base
+            recommender = load_prebuilt_recommender()
+            if recommender is None:
+                recommender = WorkoutRecommender()
+                recommender.load_data(window_features)  # Use the windowed sensor features as base
             recommendations = recommender.get_recommendations(user_preferences, n_recommendations=5)
 
+            if recommendations['profile_adjustments']:
+                st.write("**Profile Adjustments:**")
+                st.json(recommendations['profile_adjustments'])
+            for note in recommendations['personalized_notes']:
+                st.info(note)
+
             st.subheader("Top 5 Recommendations")
-            for i, rec in enumerate(recommendations, 1):
+            for i, rec in enumerate(recommendations['recommendations'], 1):
                 st.write(f"**Recommendation {i}:**")
                 st.json(rec)
         else:
@@ -0,0 +1,101 @@
+"""
+Offline index builder for the workout recommender.
+Fits the recommender on MetaMotion recordings and saves it for the API to load.
+
+Usage:
+    python -m src.build_index --data-dir data/raw/MetaMotion --output models/recommender
+    python -m src.build_index --index ivf --n-lists 1024 --n-probe 16
+"""
+
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+try:
+    from .csv_cache import read_csv_cached
+    from .exercise_catalog import ExerciseCatalog
+    from .data_processor import ExerciseDataProcessor
+    from .recommender import WorkoutRecommender
+    from .rep_segmentation import RepSegmenter
+except ImportError:
+    from csv_cache import read_csv_cached
+    from exercise_catalog import ExerciseCatalog
+    from data_processor import ExerciseDataProcessor
+    from recommender import WorkoutRecommender
+    from rep_segmentation import RepSegmenter
+
+DEFAULT_INDEX_DIR = Path("models/recommender")
+
+def preprocess_file(file: Path) -> pd.DataFrame:
+    """Load and preprocess one raw recording"""
+    processor = ExerciseDataProcessor()
+    processor.raw_data = read_csv_cached(file)
+    return processor.preprocess_data()
+
+def load_recordings(data_dir: Path, window_size: int = 25, step: int = 12) -> pd.DataFrame:
+    """
+    Load every accelerometer/gyroscope pair as fused sensor data, tagged with its exercise.
+    With a window_size, each session is summarized into one row per sliding window.
+    Every row also carries its session's rep count and tempo statistics.
+    """
+    frames = []
+    magnitudes = []
+    for session in ExerciseCatalog(data_dir).sessions():
+        if "Accelerometer" not in session or "Gyroscope" not in session:
+            continue
+        accel, gyro = session["Accelerometer"], session["Gyroscope"]
+
+        processor = ExerciseDataProcessor()
+        df = processor.fuse_sensor_data(preprocess_file(accel.path), preprocess_file(gyro.path))
+        accel_axes = [col for col in df.columns if col.startswith('accel_') and 'axis' in col]
+        magnitudes.append(np.linalg.norm(df[accel_axes].to_numpy(dtype=float), axis=1))
+        if window_size:
+            df = processor.extract_window_features(df, window_size=window_size, step=step)
+
+        # Keep the exercise and participant as row metadata for the results
+        df["participant"] = accel.participant
+        df["exercise"] = accel.exercise
+        df["source_file"] = accel.session
+        frames.append(df)
+
+    if not frames:
+        raise FileNotFoundError(f"No accelerometer/gyroscope recording pairs found in {data_dir}")
+
+    # Segment the reps of all sessions in one batch
+    rep_features = RepSegmenter().features(magnitudes)
+    for df, features in zip(frames, rep_features.to_dict(orient="records")):
+        for name, value in features.items():
+            df[name] = value
+    return pd.concat(frames, ignore_index=True)
+
+def build_index(data_dir: Path,
+                output: Path,
+                index_type: str = "brute",
+                window_size: int = 25,
+                step: int = 12,
+                **index_params) -> WorkoutRecommender:
+    """Fit the recommender on all recordings and save it to the output directory"""
+    recommender = WorkoutRecommender(index_type, **index_params)
+    recommender.load_data(load_recordings(data_dir, window_size, step))
+    recommender.save(output)
+    return recommender
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the workout recommender index")
+    parser.add_argument("--data-dir", default="data/raw/MetaMotion", help="Directory with raw MetaMotion CSVs")
+    parser.add_argument("--output", default=str(DEFAULT_INDEX_DIR), help="Directory to write the index to")
+    parser.add_argument("--index", default="brute", choices=["brute", "ivf"], help="Similarity search backend")
+    parser.add_argument("--n-lists", type=int, default=None, help="IVF buckets (default: sqrt of the row count)")
+    parser.add_argument("--n-probe", type=int, default=8, help="IVF buckets scanned per query")
+    parser.add_argument("--window-size", type=int, default=25, help="Samples per feature window (0 indexes raw samples)")
+    parser.add_argument("--step", type=int, default=12, help="Samples between feature windows")
+    args = parser.parse_args()
+
+    index_params = {"n_lists": args.n_lists, "n_probe": args.n_probe} if args.index == "ivf" else {}
+    recommender = build_index(Path(args.data_dir), Path(args.output), args.index,
+                              args.window_size, args.step, **index_params)
+    print(f"Index with {len(recommender.exercise_data)} rows saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Columnar on-disk cache for raw MetaMotion CSV files.
+Each CSV is parsed once and stored as one .npy file per column. Later loads
+memory-map those files instead of parsing text again.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Optional
+
+try:
+    from .data_processor import narrow_schema, read_metamotion_csv
+except ImportError:
+    from data_processor import narrow_schema, read_metamotion_csv
+
+DEFAULT_CACHE_DIR = Path("data/cache")
+# Bump when the layout or dtypes of the CSV entries change; older entries are rebuilt
+CACHE_FORMAT = 2
+
+def read_csv_cached(file_path, cache_dir: Optional[Path] = None) -> pd.DataFrame:
+    """
+    Read a CSV file through the columnar cache.
+
+    Entries hold the MetaMotion schema dtypes (see read_metamotion_csv) and
+    are rebuilt whenever the source file's mtime or size or CACHE_FORMAT changes.
+
+    Args:
+        file_path: Path to the CSV file
+        cache_dir (Optional[Path]): Directory holding the cache entries
+
+    Returns:
+        pd.DataFrame: The CSV contents, backed by read-only memory-mapped columns
+    """
+    file_path = Path(file_path)
+    entry_dir = Path(cache_dir or DEFAULT_CACHE_DIR) / file_path.name
+    source = file_path.stat()
+
+    meta = read_meta(entry_dir)
+    if meta is None or meta.get("format") != CACHE_FORMAT \
+            or meta["mtime_ns"] != source.st_mtime_ns or meta["size"] != source.st_size:
+        meta = _write_entry(file_path, entry_dir, source)
+
+    return read_columns(entry_dir, meta)
+
+def write_columns(df: pd.DataFrame, entry_dir: Path, **meta) -> dict:
+    """
+    Write a DataFrame as one .npy file per column, replacing any existing entry.
+
+    Text and categorical columns are stored as integer codes plus a categories
+    file, with code -1 for missing values, and come back as categoricals.
+    Safe to call concurrently for the same entry from several threads or processes.
+
+    Args:
+        df (pd.DataFrame): Data to write
+        entry_dir (Path): Directory for the column files
+        **meta: Extra fields stored in the entry's meta.json
+
+    Returns:
+        dict: The entry's metadata
+    """
+    entry_dir = Path(entry_dir)
+    entry_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(dir=entry_dir.parent, prefix=f"{entry_dir.name}.tmp-"))
+
+    try:
+        columns = []
+        for i, name in enumerate(df.columns):
+            values = df[name]
+            column = {"name": name, "file": f"{i}.npy"}
+            if values.dtype == object or isinstance(values.dtype, pd.CategoricalDtype):
+                # Python objects cannot be memory-mapped; codes can, and keep NaN as -1
+                categorical = pd.Categorical(values.astype(str).where(values.notna()))
+                column["categories"] = f"{i}.categories.npy"
+                np.save(tmp_dir / column["categories"], categorical.categories.to_numpy(dtype=str))
+                values = categorical.codes
+            elif isinstance(values.dtype, pd.api.extensions.ExtensionDtype) and hasattr(values.dtype, "numpy_dtype"):
+                # Nullable numbers (e.g. an Int64 epoch with gaps) become plain values plus a mask
+                column["dtype"] = str(values.dtype)
+                column["mask"] = f"{i}.mask.npy"
+                np.save(tmp_dir / column["mask"], values.isna().to_numpy())
+                values = values.to_numpy(dtype=values.dtype.numpy_dtype, na_value=0)
+            np.save(tmp_dir / column["file"], np.asarray(values))
+            columns.append(column)
+
+        meta = dict(meta, columns=columns)
+        with open(tmp_dir / "meta.json", "w") as f:
+            json.dump(meta, f)
+
+        _swap_in(tmp_dir, entry_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return meta
+
+def _swap_in(tmp_dir: Path, entry_dir: Path, attempts: int = 10) -> None:
+    """
+    Move a finished entry into place. A directory cannot be renamed over a
+    non-empty one, so any current entry is first renamed aside (to a unique
+    name, in case another writer is doing the same) and deleted afterwards.
+    """
+    for _ in range(attempts):
+        try:
+            os.rename(tmp_dir, entry_dir)
+            return
+        except OSError:
+            if not entry_dir.exists():
+                raise
+        aside = Path(tempfile.mkdtemp(dir=entry_dir.parent, prefix=f"{entry_dir.name}.old-"))
+        try:
+            os.rename(entry_dir, aside / "entry")
+        except FileNotFoundError:
+            pass  # Another writer moved it first
+        shutil.rmtree(aside, ignore_errors=True)
+    os.rename(tmp_dir, entry_dir)
+
+def read_columns(entry_dir: Path, meta: Optional[dict] = None, attempts: int = 3) -> pd.DataFrame:
+    """
+    Memory-map a DataFrame written with write_columns().
+
+    Args:
+        entry_dir (Path): Directory with the column files
+        meta (Optional[dict]): The entry's metadata, read from meta.json if not given
+        attempts (int): Tries when a concurrent write swaps the entry out while it is read
+
+    Returns:
+        pd.DataFrame: Data backed by read-only memory-mapped columns
+    """
+    entry_dir = Path(entry_dir)
+    for attempt in range(attempts):
+        if attempt:
+            # A writer may be between moving the old entry aside and moving the new one in
+            time.sleep(0.01 * 2 ** attempt)
+            meta = None
+        meta = meta or read_meta(entry_dir)
+        if meta is None:
+            continue
+        try:
+            columns = {column["name"]: _load_column(entry_dir, column) for column in meta["columns"]}
+        except FileNotFoundError:
+            continue
+        # copy=False keeps every column backed by its memory map
+        return pd.DataFrame(columns, copy=False)
+    raise FileNotFoundError(f"No column store found at {entry_dir}")
+
+def _load_column(entry_dir: Path, column: dict):
+    values = np.load(entry_dir / column["file"], mmap_mode="r")
+    if "categories" in column:
+        return pd.Categorical.from_codes(values, categories=np.load(entry_dir / column["categories"]))
+    if "mask" in column:
+        array_type = pd.api.types.pandas_dtype(column["dtype"]).construct_array_type()
+        return array_type(values, np.load(entry_dir / column["mask"], mmap_mode="r"))
+    return values
+
+def read_meta(entry_dir: Path) -> Optional[dict]:
+    """Return the metadata of a column store, or None if there is no valid entry"""
+    try:
+        with open(Path(entry_dir) / "meta.json", "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_entry(file_path: Path, entry_dir: Path, source: os.stat_result) -> dict:
+    """Parse the CSV with the MetaMotion schema and write its columns to a fresh cache entry"""
+    # Files without epoch gaps get a plain int64 epoch
+    return write_columns(narrow_schema(read_metamotion_csv(file_path)), entry_dir, format=CACHE_FORMAT,
+                         mtime_ns=source.st_mtime_ns, size=source.st_size)
@@ -6,7 +6,117 @@ Handles loading, cleaning, and preprocessing of exercise data.
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterator, List, Optional
+
+try:
+    from .streaming_quantile import TDigest
+except ImportError:
+    from streaming_quantile import TDigest
+
+EPOCH_COLUMN = "epoch (ms)"
+ELAPSED_COLUMN = "elapsed (s)"
+TIME_COLUMN_PREFIX = "time ("  # Per-row timestamp strings, e.g. "time (01:00)"; the epoch carries the same information
+WINDOW_STATS = ["mean", "std", "rms", "range", "dominant_freq"]
+
+def metamotion_schema(columns) -> Dict[str, str]:
+    """
+    Map the columns of a MetaMotion recording to compact dtypes.
+    
+    The epoch is nullable Int64 so rows with gaps can still be read and
+    forward-filled (narrow_schema() makes it int64 afterwards); elapsed
+    seconds and the axes become float32. Timestamp string columns are left
+    out so they can be dropped.
+    
+    Args:
+        columns: Column names of the recording
+        
+    Returns:
+        Dict[str, str]: dtype per column to keep
+    """
+    schema = {}
+    for col in columns:
+        if col == EPOCH_COLUMN:
+            schema[col] = "Int64"
+        elif col == ELAPSED_COLUMN or 'axis' in col:
+            schema[col] = "float32"
+    return schema
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Drop the timestamp strings and cast a MetaMotion frame to the compact dtypes.
+    Frames without MetaMotion columns are returned unchanged.
+    """
+    schema = metamotion_schema(df.columns)
+    if not schema:
+        return df
+    keep = [col for col in df.columns if not col.startswith(TIME_COLUMN_PREFIX)]
+    return df[keep].astype(schema)
+
+def narrow_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Turn a gap-free nullable epoch column into plain int64; call after missing values are filled"""
+    if EPOCH_COLUMN in df.columns and isinstance(df[EPOCH_COLUMN].dtype, pd.Int64Dtype) \
+            and not df[EPOCH_COLUMN].hasnans:
+        df = df.astype({EPOCH_COLUMN: "int64"})
+    return df
+
+def read_metamotion_csv(file_path, **kwargs):
+    """
+    Read a MetaMotion CSV with its dtypes fixed at read time and the timestamp strings skipped.
+    Extra keyword arguments (e.g. chunksize) are passed to pd.read_csv.
+    """
+    columns = pd.read_csv(file_path, nrows=0).columns
+    usecols = [col for col in columns if not col.startswith(TIME_COLUMN_PREFIX)]
+    return pd.read_csv(file_path, usecols=usecols, dtype=metamotion_schema(columns), **kwargs)
+
+def window_statistics(signals: np.ndarray,
+                      window_size: int,
+                      step: int,
+                      sample_rate: float) -> Dict[str, np.ndarray]:
+    """
+    Compute WINDOW_STATS over sliding windows of several signals at once.
+
+    Args:
+        signals (np.ndarray): Samples, one signal per column (at least window_size rows)
+        window_size (int): Samples per window
+        step (int): Samples between the starts of consecutive windows
+        sample_rate (float): Sampling rate of the signals in Hz
+
+    Returns:
+        Dict[str, np.ndarray]: One (n_windows, n_signals) array per statistic
+    """
+    # (n_windows, n_signals, window_size) view over the signals
+    windows = np.lib.stride_tricks.sliding_window_view(signals, window_size, axis=0)[::step]
+
+    mean = windows.mean(axis=2)
+    centered = windows - mean[..., np.newaxis]
+    spectrum = np.abs(np.fft.rfft(centered, axis=2))
+    spectrum[..., 0] = 0  # Ignore the DC component
+    return {
+        "mean": mean,
+        "std": windows.std(axis=2),
+        "rms": np.sqrt(np.mean(np.square(windows), axis=2)),
+        "range": np.ptp(windows, axis=2),
+        "dominant_freq": spectrum.argmax(axis=2) * sample_rate / window_size,
+    }
+
+def memory_report(df: pd.DataFrame) -> Dict:
+    """
+    Report how much memory a frame uses, in total and per column.
+    
+    Args:
+        df (pd.DataFrame): Frame to measure
+        
+    Returns:
+        Dict: Row count, total bytes, bytes per row and bytes per column
+    """
+    column_bytes = df.memory_usage(index=False, deep=True)
+    total_bytes = int(df.memory_usage(index=True, deep=True).sum())
+    return {
+        'rows': len(df),
+        'total_bytes': total_bytes,
+        'bytes_per_row': total_bytes / len(df) if len(df) else 0.0,
+        'columns': {col: int(n_bytes) for col, n_bytes in column_bytes.items()}
+    }
 
 class ExerciseDataProcessor:
     def __init__(self, data_dir: str = "../data"):
@@ -19,6 +129,8 @@ class ExerciseDataProcessor:
         self.data_dir = Path(data_dir)
         self.raw_data = None
         self.processed_data = None
+        # Magnitude distribution of the last recording streamed by iter_processed_chunks
+        self.magnitude_digest = None
     
     def load_raw_data(self, file_path: str) -> pd.DataFrame:
         """
@@ -32,7 +144,7 @@ class ExerciseDataProcessor:
         """
         file_path = self.data_dir / "raw" / file_path
         try:
-            self.raw_data = pd.read_csv(file_path)
+            self.raw_data = read_metamotion_csv(file_path)
             return self.raw_data
         except Exception as e:
             print(f"Error loading data: {e}")
@@ -48,14 +160,15 @@ class ExerciseDataProcessor:
         if self.raw_data is None:
             raise ValueError("No raw data loaded. Call load_raw_data first.")
         
-        # Basic preprocessing steps
-        df = self.raw_data.copy()
+        # Drop timestamp strings and use compact dtypes (no-op for data read with the schema)
+        df = apply_schema(self.raw_data)
         
-        # Remove duplicates
+        # Remove duplicates (returns a new frame, so the raw data is left untouched)
         df = df.drop_duplicates()
         
         # Handle missing values
-        df = df.fillna(method='ffill')
+        df.ffill(inplace=True)
+        df = narrow_schema(df)
         
         # Convert categorical variables
         categorical_columns = df.select_dtypes(include=['object']).columns
@@ -65,6 +178,176 @@ class ExerciseDataProcessor:
         self.processed_data = df
         return df
     
+    def iter_processed_chunks(self, file_path: str, chunk_size: int = 50000) -> Iterator[pd.DataFrame]:
+        """
+        Stream a raw recording in fixed-size chunks and preprocess each one.
+        
+        Duplicate removal and forward-fill carry their state across chunk
+        boundaries: rows repeated from the previous chunk are dropped and
+        leading gaps are filled from the last values seen. Only one chunk is
+        held in memory at a time, whatever the length of the recording.
+        Object columns are not converted to categories, since the categories
+        would differ from chunk to chunk. The sample magnitude of each chunk
+        goes into its own TDigest, merged into self.magnitude_digest, so
+        quantile thresholds of the whole recording are known once it has been
+        streamed.
+        
+        Args:
+            file_path (str): Path to the raw data file, relative to data_dir/raw
+            chunk_size (int): Rows read per chunk
+            
+        Yields:
+            pd.DataFrame: Processed chunks, in file order
+        """
+        file_path = self.data_dir / "raw" / file_path
+        previous_hashes = pd.Index([])
+        last_values = None
+        self.magnitude_digest = TDigest()
+        
+        for chunk in read_metamotion_csv(file_path, chunksize=chunk_size):
+            # Drop duplicates within the chunk and of rows from the previous chunk
+            chunk = chunk.drop_duplicates()
+            hashes = pd.util.hash_pandas_object(chunk, index=False)
+            chunk = chunk[~hashes.isin(previous_hashes).to_numpy()]
+            previous_hashes = pd.Index(hashes)
+            if chunk.empty:
+                continue
+            
+            # Forward-fill, continuing from the end of the previous chunk
+            chunk = chunk.ffill()
+            if last_values is not None:
+                chunk = chunk.fillna(last_values)
+            chunk = narrow_schema(chunk)
+            last_values = chunk.iloc[-1]
+            
+            axes = [col for col in chunk.columns if 'axis' in col]
+            if axes:
+                magnitude = np.linalg.norm(chunk[axes].to_numpy(dtype=float), axis=1)
+                self.magnitude_digest.merge(TDigest().update(magnitude))
+            
+            yield chunk
+    
+    def process_stream(self,
+                       file_path: str,
+                       sink: Callable[[pd.DataFrame], None],
+                       chunk_size: int = 50000) -> int:
+        """
+        Preprocess a raw recording chunk by chunk and hand every chunk to a sink.
+        
+        The sink can be any callable taking a DataFrame, e.g. a csv_sink(),
+        WorkoutRecommender.append_data or a feature extractor.
+        
+        Args:
+            file_path (str): Path to the raw data file, relative to data_dir/raw
+            sink (Callable): Called with each processed chunk
+            chunk_size (int): Rows read per chunk
+            
+        Returns:
+            int: Number of processed rows
+        """
+        n_rows = 0
+        for chunk in self.iter_processed_chunks(file_path, chunk_size):
+            sink(chunk)
+            n_rows += len(chunk)
+        return n_rows
+    
+    def fuse_sensor_data(self,
+                         accel_data: pd.DataFrame,
+                         gyro_data: pd.DataFrame,
+                         tolerance_ms: int = 40) -> pd.DataFrame:
+        """
+        Align accelerometer and gyroscope recordings into one table.
+        
+        Each accelerometer sample (12.5 Hz) is matched with the nearest
+        gyroscope sample (25 Hz) by epoch time using a sorted merge_asof.
+        Axis columns are prefixed with "accel_" and "gyro_" so both sensors
+        feed the recommender from a single aligned array.
+        
+        Args:
+            accel_data (pd.DataFrame): Preprocessed accelerometer data
+            gyro_data (pd.DataFrame): Preprocessed gyroscope data
+            tolerance_ms (int): Largest time gap allowed between matched samples
+            
+        Returns:
+            pd.DataFrame: Fused sensor data
+        """
+        for data in (accel_data, gyro_data):
+            if EPOCH_COLUMN not in data.columns:
+                raise ValueError(f"Sensor data has no '{EPOCH_COLUMN}' column to align on.")
+        
+        accel_axes = [col for col in accel_data.columns if 'axis' in col]
+        gyro_axes = [col for col in gyro_data.columns if 'axis' in col]
+        time_columns = [col for col in (EPOCH_COLUMN, ELAPSED_COLUMN) if col in accel_data.columns]
+        
+        accel = accel_data[time_columns + accel_axes].rename(columns={col: f"accel_{col}" for col in accel_axes})
+        gyro = gyro_data[[EPOCH_COLUMN] + gyro_axes].rename(columns={col: f"gyro_{col}" for col in gyro_axes})
+        
+        df = pd.merge_asof(
+            accel.sort_values(EPOCH_COLUMN),
+            gyro.sort_values(EPOCH_COLUMN),
+            on=EPOCH_COLUMN,
+            direction="nearest",
+            tolerance=tolerance_ms
+        )
+        
+        # Drop accelerometer samples with no gyroscope sample close enough
+        df = df.dropna(subset=[f"gyro_{col}" for col in gyro_axes]).reset_index(drop=True)
+        
+        self.processed_data = df
+        return df
+    
+    def extract_window_features(self,
+                                data: pd.DataFrame,
+                                window_size: int = 25,
+                                step: int = 12,
+                                sample_rate: float = 12.5) -> pd.DataFrame:
+        """
+        Summarize sensor data over fixed-length overlapping windows.
+        
+        Every axis column, plus the magnitude of each sensor, is described by
+        its mean, std, RMS, range and dominant FFT frequency per window. All
+        windows are computed at once over a strided view of the signals, so
+        the recording is never copied per window.
+        
+        Args:
+            data (pd.DataFrame): Preprocessed (or fused) sensor data
+            window_size (int): Samples per window
+            step (int): Samples between the starts of consecutive windows
+            sample_rate (float): Sampling rate of the data in Hz
+            
+        Returns:
+            pd.DataFrame: One row of features per window
+        """
+        axis_columns = [col for col in data.columns if 'axis' in col]
+        if not axis_columns:
+            raise ValueError("Sensor data has no axis columns to extract features from.")
+        
+        # Group the axes by sensor, e.g. "accel_x-axis (g)" -> "accel_", to add a magnitude signal
+        sensors = {}
+        for col in axis_columns:
+            sensors.setdefault(col.split('-axis')[0][:-1], []).append(col)
+        
+        axes = data[axis_columns].to_numpy(dtype=float)
+        magnitudes = [np.linalg.norm(data[cols].to_numpy(dtype=float), axis=1) for cols in sensors.values()]
+        signals = np.column_stack([axes] + magnitudes)
+        signal_names = axis_columns + [f"{prefix}magnitude" for prefix in sensors]
+        
+        if len(signals) < window_size:
+            return pd.DataFrame(columns=[f"{name}_{stat}" for name in signal_names for stat in WINDOW_STATS])
+        
+        stats = window_statistics(signals, window_size, step, sample_rate)
+        
+        features = {}
+        starts = np.arange(len(stats["mean"])) * step
+        for col in (EPOCH_COLUMN, ELAPSED_COLUMN):
+            if col in data.columns:
+                features[col] = data[col].to_numpy()[starts]
+        for i, name in enumerate(signal_names):
+            for stat in WINDOW_STATS:
+                features[f"{name}_{stat}"] = stats[stat][:, i]
+        
+        return pd.DataFrame(features)
+    
     def save_processed_data(self, filename: str) -> None:
         """
         Save processed data to a file.
@@ -77,4 +360,19 @@ class ExerciseDataProcessor:
         
         output_path = self.data_dir / "processed" / filename
         self.processed_data.to_csv(output_path, index=False)
-        print(f"Processed data saved to {output_path}") 
\ No newline at end of file
+        print(f"Processed data saved to {output_path}") 
+
+def csv_sink(output_path) -> Callable[[pd.DataFrame], None]:
+    """
+    Create a sink for process_stream() that appends every chunk to one CSV file.
+    
+    Args:
+        output_path: Path of the CSV file to write, replaced if it exists
+    """
+    output_path = Path(output_path)
+    output_path.unlink(missing_ok=True)
+    
+    def write_chunk(chunk: pd.DataFrame) -> None:
+        chunk.to_csv(output_path, mode="a", header=not output_path.exists(), index=False)
+    
+    return write_chunk
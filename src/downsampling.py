@@ -0,0 +1,93 @@
+"""
+Range selection and shape-preserving downsampling of sensor recordings.
+Used to serve plots at screen resolution instead of at sensor resolution.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import List, Optional
+
+try:
+    from .data_processor import ELAPSED_COLUMN
+except ImportError:
+    from data_processor import ELAPSED_COLUMN
+
+def select_time_range(df: pd.DataFrame,
+                      start: Optional[float] = None,
+                      end: Optional[float] = None,
+                      time_column: str = ELAPSED_COLUMN) -> pd.DataFrame:
+    """
+    Select the rows whose time lies in [start, end] with a binary search.
+
+    Args:
+        df (pd.DataFrame): Recording sorted by time_column
+        start (Optional[float]): First time to keep, from the beginning if None
+        end (Optional[float]): Last time to keep, to the end if None
+        time_column (str): Column holding the time
+
+    Returns:
+        pd.DataFrame: The selected rows
+    """
+    if start is None and end is None:
+        return df
+    times = df[time_column].to_numpy()
+    first = 0 if start is None else np.searchsorted(times, start, side="left")
+    last = len(times) if end is None else np.searchsorted(times, end, side="right")
+    return df.iloc[first:last]
+
+def minmax_indices(signals: np.ndarray, n_buckets: int) -> np.ndarray:
+    """
+    Pick the minimum and maximum sample of every bucket for each signal.
+
+    Args:
+        signals (np.ndarray): Samples, one signal per column
+        n_buckets (int): Number of equal-width buckets to split the samples into
+
+    Returns:
+        np.ndarray: Sorted, unique row indices to keep
+    """
+    n_samples = len(signals)
+    bucket_size = int(np.ceil(n_samples / n_buckets))
+    n_buckets = int(np.ceil(n_samples / bucket_size))
+
+    # Pad to a whole number of buckets; padding never wins argmin/argmax
+    padded = np.full((n_buckets * bucket_size, signals.shape[1]), np.nan)
+    padded[:n_samples] = signals
+    buckets = padded.reshape(n_buckets, bucket_size, signals.shape[1])
+    missing = np.isnan(buckets)
+
+    offsets = (np.arange(n_buckets) * bucket_size)[:, np.newaxis]
+    lows = np.where(missing, np.inf, buckets).argmin(axis=1) + offsets
+    highs = np.where(missing, -np.inf, buckets).argmax(axis=1) + offsets
+
+    indices = np.unique(np.concatenate([lows.ravel(), highs.ravel(), [0, n_samples - 1]]))
+    return indices[indices < n_samples]
+
+def downsample(df: pd.DataFrame, max_points: int, value_columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Reduce a recording to about max_points rows while keeping its peaks.
+
+    Each signal keeps the minimum and maximum of every bucket, so spikes that
+    plain decimation would skip stay visible.
+
+    Args:
+        df (pd.DataFrame): Recording sorted by time
+        max_points (int): Upper bound on the number of rows returned
+        value_columns (Optional[List[str]]): Signals to preserve, defaults to the axis columns
+
+    Returns:
+        pd.DataFrame: The selected rows, in time order
+    """
+    if max_points is None or len(df) <= max_points:
+        return df
+    value_columns = value_columns or [col for col in df.columns if 'axis' in col]
+
+    # Two samples per bucket and signal, plus the first and last sample
+    n_buckets = (max_points - 2) // (2 * len(value_columns)) if value_columns else 0
+    if n_buckets >= 1:
+        indices = minmax_indices(df[value_columns].to_numpy(dtype=float), n_buckets)
+        if len(indices) <= max_points:
+            return df.iloc[indices]
+
+    # Too few points for a min and max per signal: plain decimation
+    return df.iloc[np.unique(np.linspace(0, len(df) - 1, max(max_points, 0)).astype(int))]
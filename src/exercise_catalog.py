@@ -0,0 +1,159 @@
+"""
+In-memory catalog of the raw MetaMotion recordings.
+Parses every file name once and answers exercise, participant and sensor lookups
+from dictionaries instead of globbing the data directory on every request.
+"""
+
+import re
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# e.g. A-bench-heavy2-rpe8_MetaWear_2019-01-11T16.10.08.270_C42732BE255C_Accelerometer_12.500Hz_1.4.4.csv
+FILENAME_PATTERN = re.compile(
+    r'^(?P<participant>[A-Z])-(?P<exercise>[a-z_]+)'
+    r'(?:-(?P<intensity>[a-z]+\d*))?(?:-rpe(?P<rpe>\d+))?'
+    r'_MetaWear_(?P<timestamp>\d{4}-\d{2}-\d{2}T\d{2}\.\d{2}\.\d{2}\.\d{3})'
+    r'_(?P<device>[0-9A-F]+)_(?P<sensor>Accelerometer|Gyroscope)_(?P<sample_rate>[\d.]+)Hz'
+)
+
+class RecordingFile(NamedTuple):
+    path: Path
+    participant: str
+    exercise: str
+    intensity: Optional[str]
+    rpe: Optional[int]
+    sensor: str
+    sample_rate: float
+    timestamp: datetime
+    session: str  # File name up to the sensor, shared by the accelerometer and gyroscope files
+
+def parse_filename(path: Path) -> Optional[RecordingFile]:
+    """
+    Parse a MetaMotion file name into its fields.
+
+    Args:
+        path (Path): Path to the recording
+
+    Returns:
+        Optional[RecordingFile]: Parsed fields, or None if the name does not match
+    """
+    match = FILENAME_PATTERN.match(path.name)
+    if not match:
+        return None
+    return RecordingFile(
+        path=path,
+        participant=match.group('participant'),
+        exercise=match.group('exercise'),
+        intensity=match.group('intensity'),
+        rpe=int(match.group('rpe')) if match.group('rpe') else None,
+        sensor=match.group('sensor'),
+        sample_rate=float(match.group('sample_rate')),
+        timestamp=datetime.strptime(match.group('timestamp'), "%Y-%m-%dT%H.%M.%S.%f"),
+        session=path.name.split(f"_{match.group('sensor')}")[0]
+    )
+
+class ExerciseCatalog:
+    def __init__(self, data_dir: str = "data/raw/MetaMotion", refresh_interval: float = 5.0):
+        """
+        Initialize the catalog.
+
+        Args:
+            data_dir (str): Directory with the raw MetaMotion CSV files
+            refresh_interval (float): Minimum seconds between checks of the directory for changes
+        """
+        self.data_dir = Path(data_dir)
+        self.refresh_interval = refresh_interval
+        self._dir_mtime = None
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+        self._files = []
+        self._by_exercise = {}
+        self._by_participant = {}
+        self._by_sensor = {}
+
+    def refresh(self, force: bool = False) -> None:
+        """
+        Rebuild the catalog if the data directory has changed since the last scan.
+        The directory is checked at most once per refresh_interval unless force is set.
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_interval:
+            return
+
+        with self._lock:
+            self._checked_at = now
+            try:
+                dir_mtime = self.data_dir.stat().st_mtime_ns
+            except FileNotFoundError:
+                dir_mtime = None
+            if not force and dir_mtime == self._dir_mtime and self._dir_mtime is not None:
+                return
+
+            files = []
+            if dir_mtime is not None:
+                files = [record for record in map(parse_filename, self.data_dir.glob("*.csv")) if record]
+            files.sort(key=lambda record: (record.timestamp, record.path.name))
+
+            by_exercise, by_participant, by_sensor = {}, {}, {}
+            for record in files:
+                by_exercise.setdefault(record.exercise, []).append(record)
+                by_participant.setdefault(record.participant, []).append(record)
+                by_sensor.setdefault(record.sensor, []).append(record)
+
+            self._files = files
+            self._by_exercise = by_exercise
+            self._by_participant = by_participant
+            self._by_sensor = by_sensor
+            self._dir_mtime = dir_mtime
+
+    def exercises(self) -> List[str]:
+        """Names of all exercises with at least one recording"""
+        self.refresh()
+        return sorted(self._by_exercise)
+
+    def by_exercise(self, exercise: str) -> List[RecordingFile]:
+        """Recordings of exactly this exercise, oldest first"""
+        self.refresh()
+        return self._by_exercise.get(exercise, [])
+
+    def by_participant(self, participant: str) -> List[RecordingFile]:
+        """Recordings of one participant, oldest first"""
+        self.refresh()
+        return self._by_participant.get(participant, [])
+
+    def by_sensor(self, sensor: str) -> List[RecordingFile]:
+        """Recordings from one sensor, oldest first"""
+        self.refresh()
+        return self._by_sensor.get(sensor, [])
+
+    def sessions(self, exercise: Optional[str] = None) -> List[Dict[str, RecordingFile]]:
+        """
+        Group recordings into sessions, mapping sensor name to file.
+
+        Args:
+            exercise (Optional[str]): Only return sessions of this exercise
+
+        Returns:
+            List[Dict[str, RecordingFile]]: Sessions, oldest first
+        """
+        self.refresh()
+        records = self._by_exercise.get(exercise, []) if exercise else self._files
+        sessions = {}
+        for record in records:
+            sessions.setdefault(record.session, {}).setdefault(record.sensor, record)
+        return list(sessions.values())
+
+    def latest_pair(self, exercise: str) -> Tuple[Optional[Path], Optional[Path]]:
+        """
+        Find the most recent session of an exercise with both sensors recorded.
+
+        Returns:
+            Tuple[Optional[Path], Optional[Path]]: Accelerometer and gyroscope files, or (None, None)
+        """
+        for session in reversed(self.sessions(exercise)):
+            if "Accelerometer" in session and "Gyroscope" in session:
+                return session["Accelerometer"].path, session["Gyroscope"].path
+        return None, None
@@ -0,0 +1,206 @@
+"""
+Live sensor sessions for real-time ingest.
+Each session keeps its most recent samples in fixed-size NumPy ring buffers and
+updates window features and rep counts as samples arrive, so the cost per
+message depends on the message, not on how long the session has been running.
+"""
+
+import time
+import numpy as np
+from typing import Dict, List
+
+try:
+    from .data_processor import ELAPSED_COLUMN, WINDOW_STATS, window_statistics
+    from .rep_segmentation import StreamingRepCounter
+    from .streaming_quantile import TDigest
+except ImportError:
+    from data_processor import ELAPSED_COLUMN, WINDOW_STATS, window_statistics
+    from rep_segmentation import StreamingRepCounter
+    from streaming_quantile import TDigest
+
+ACCEL_AXES = ["x-axis (g)", "y-axis (g)", "z-axis (g)"]
+GYRO_AXES = ["x-axis (deg/s)", "y-axis (deg/s)", "z-axis (deg/s)"]
+
+# Column layout of the fused buffer, named like the offline fused table
+FUSED_COLUMNS = ([ELAPSED_COLUMN] + [f"accel_{axis}" for axis in ACCEL_AXES]
+                 + [f"gyro_{axis}" for axis in GYRO_AXES])
+
+# Window feature names, in the order ExerciseDataProcessor.extract_window_features emits them
+SIGNAL_NAMES = FUSED_COLUMNS[1:] + ["accel_magnitude", "gyro_magnitude"]
+FEATURE_NAMES = [f"{name}_{stat}" for name in SIGNAL_NAMES for stat in WINDOW_STATS]
+
+# Magnitude quantile above which a sample counts as active movement
+ACTIVITY_QUANTILE = 0.75
+
+class RingBuffer:
+    def __init__(self, capacity: int, n_columns: int, dtype=np.float32):
+        """
+        Fixed-size buffer keeping the latest `capacity` rows.
+
+        Args:
+            capacity (int): Rows kept
+            n_columns (int): Values per row
+            dtype: Storage type
+        """
+        self.capacity = capacity
+        self._data = np.zeros((capacity, n_columns), dtype=dtype)
+        self.total = 0  # Rows ever written
+
+    def __len__(self) -> int:
+        return min(self.total, self.capacity)
+
+    def extend(self, rows: np.ndarray) -> None:
+        """Append rows, overwriting the oldest ones once the buffer is full"""
+        n_rows = len(rows)
+        rows = rows[-self.capacity:]
+        start = (self.total + n_rows - len(rows)) % self.capacity
+        first = min(len(rows), self.capacity - start)
+        self._data[start:start + first] = rows[:first]
+        self._data[:len(rows) - first] = rows[first:]
+        self.total += n_rows
+
+    def since(self, row: int) -> np.ndarray:
+        """
+        Copy of the rows written from absolute row number `row` on, oldest first.
+        Rows that have already been overwritten are left out.
+        """
+        row = max(row, self.total - len(self))
+        n_rows = self.total - row
+        if n_rows <= 0:
+            return self._data[:0].copy()
+        indices = np.arange(row, self.total) % self.capacity
+        return self._data[indices]
+
+class LiveSession:
+    def __init__(self,
+                 session_id: str,
+                 window_size: int = 25,
+                 step: int = 12,
+                 sample_rate: float = 12.5,
+                 capacity: int = 1024):
+        """
+        Initialize a live session.
+
+        Args:
+            session_id (str): Identifier of the streaming device or athlete
+            window_size (int): Samples per feature window, as in ExerciseDataProcessor.extract_window_features
+            step (int): Samples between the starts of consecutive windows
+            sample_rate (float): Accelerometer sampling rate in Hz
+            capacity (int): Rows kept per ring buffer
+        """
+        if capacity < window_size + step:
+            raise ValueError("capacity must hold at least one window plus one step")
+        self.session_id = session_id
+        self.window_size = window_size
+        self.step = step
+        self.sample_rate = sample_rate
+        self.started_at = time.time()
+
+        # Gyroscope samples are kept as they come; each accelerometer sample is
+        # paired with the latest gyroscope sample at or before it
+        self.gyro = RingBuffer(capacity, 1 + len(GYRO_AXES))
+        self.fused = RingBuffer(capacity, len(FUSED_COLUMNS))
+        self.rep_counter = StreamingRepCounter()
+        # Magnitude distribution of the whole session, in constant memory
+        self.accel_digest = TDigest()
+        self.gyro_digest = TDigest()
+
+        self.windows = 0
+        self._next_window = 0  # Absolute fused row where the next window starts
+        self._feature_sums = np.zeros(len(FEATURE_NAMES))
+
+    def add_samples(self, sensor: str, samples: np.ndarray) -> int:
+        """
+        Ingest samples from one sensor.
+
+        Args:
+            sensor (str): "accelerometer" or "gyroscope"
+            samples (np.ndarray): Rows of [elapsed seconds, x, y, z], in time order
+
+        Returns:
+            int: Number of new feature windows completed
+        """
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1, 4)
+        if sensor == "gyroscope":
+            self.gyro.extend(samples)
+            self.gyro_digest.update(np.linalg.norm(samples[:, 1:], axis=1))
+            return 0
+        if sensor != "accelerometer":
+            raise ValueError(f"Unknown sensor: {sensor}")
+        if not len(samples):
+            return 0
+
+        # Backward as-of join against the buffered gyroscope samples
+        gyro = self.gyro.since(0)
+        gyro_values = np.full((len(samples), len(GYRO_AXES)), np.nan, dtype=np.float32)
+        if len(gyro):
+            match = np.searchsorted(gyro[:, 0], samples[:, 0], side="right") - 1
+            found = match >= 0
+            gyro_values[found] = gyro[match[found], 1:]
+        self.fused.extend(np.hstack([samples, gyro_values]))
+
+        magnitude = np.linalg.norm(samples[:, 1:], axis=1)
+        self.accel_digest.update(magnitude)
+        self.rep_counter.update(magnitude)
+        return self._update_windows()
+
+    def features(self) -> Dict[str, float]:
+        """
+        Session summary in the recommender's feature space.
+
+        Returns:
+            Dict[str, float]: Mean of every window feature so far, plus the rep features
+        """
+        features = {}
+        if self.windows:
+            features.update(zip(FEATURE_NAMES, (self._feature_sums / self.windows).tolist()))
+        features.update(self.rep_counter.features())
+        return features
+
+    def stats(self) -> Dict:
+        """Sample, window and rep counts and the current activity thresholds, for monitoring"""
+        return {
+            "session_id": self.session_id,
+            "samples": self.fused.total,
+            "windows": self.windows,
+            "reps": self.rep_counter.rep_count,
+            "seconds": time.time() - self.started_at,
+            "accel_threshold": _threshold(self.accel_digest),
+            "gyro_threshold": _threshold(self.gyro_digest),
+        }
+
+    def _update_windows(self) -> int:
+        """Compute the features of every window completed by the new rows"""
+        # Windows whose rows were already overwritten are skipped
+        oldest = self.fused.total - len(self.fused)
+        if self._next_window < oldest:
+            self._next_window += -(-(oldest - self._next_window) // self.step) * self.step
+
+        available = self.fused.total - self._next_window
+        if available < self.window_size:
+            return 0
+        n_windows = (available - self.window_size) // self.step + 1
+        rows = self.fused.since(self._next_window)[:(n_windows - 1) * self.step + self.window_size]
+
+        # Same statistics as the offline windows, computed on arrays to keep per-message overhead low
+        accel, gyro = rows[:, 1:4].astype(float), rows[:, 4:7].astype(float)
+        signals = np.column_stack([accel, gyro, np.linalg.norm(accel, axis=1), np.linalg.norm(gyro, axis=1)])
+        stats = window_statistics(signals, self.window_size, self.step, self.sample_rate)
+        # (n_windows, n_signals, n_stats) summed over windows, flattened signal-major like FEATURE_NAMES
+        sums = np.stack([stats[stat] for stat in WINDOW_STATS], axis=2).sum(axis=0).ravel()
+        self._feature_sums += np.nan_to_num(sums)
+
+        self.windows += n_windows
+        self._next_window += n_windows * self.step
+        return n_windows
+
+def _threshold(digest: TDigest):
+    """Activity threshold of a digest, None until it has seen a sample"""
+    return float(digest.quantile(ACTIVITY_QUANTILE)) if digest.count else None
+
+def parse_samples(rows: List[List[float]]) -> np.ndarray:
+    """Turn a JSON list of [elapsed, x, y, z] rows into an array, rejecting malformed input"""
+    samples = np.asarray(rows, dtype=np.float32)
+    if samples.ndim != 2 or samples.shape[1] != 4:
+        raise ValueError("samples must be a list of [elapsed, x, y, z] rows")
+    return samples
@@ -0,0 +1,191 @@
+"""
+Multi-resolution (level-of-detail) pyramid of a sensor recording.
+Level 0 holds every sample; each further level keeps the minimum and maximum of
+every `factor` buckets of the level below, so a plot of any time range can be
+drawn from a number of rows proportional to its pixel width.
+"""
+
+import json
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import List, Optional
+
+try:
+    from .csv_cache import read_columns, write_columns
+    from .data_processor import EPOCH_COLUMN, ELAPSED_COLUMN
+except ImportError:
+    from csv_cache import read_columns, write_columns
+    from data_processor import EPOCH_COLUMN, ELAPSED_COLUMN
+
+PYRAMID_META_FILE = "pyramid.json"
+
+def with_magnitude(df: pd.DataFrame) -> pd.DataFrame:
+    """Add the Euclidean norm of the axis columns as a 'magnitude' column"""
+    axes = df[[col for col in df.columns if 'axis' in col]].to_numpy(dtype=float)
+    return df.assign(magnitude=np.sqrt(np.square(axes).sum(axis=1)).astype(np.float32))
+
+def _envelope(level: pd.DataFrame, bucket_rows: int, time_columns: List[str], value_columns: List[str]) -> pd.DataFrame:
+    """
+    Reduce every bucket of rows to two rows holding its extremes.
+
+    The first row carries the bucket's start time and, for each value column,
+    whichever of the minimum and maximum occurs first; the second row carries
+    the end time and the other extreme.
+    """
+    n_rows = len(level)
+    n_buckets = -(-n_rows // bucket_rows)
+    starts = np.arange(n_buckets) * bucket_rows
+    ends = np.minimum(starts + bucket_rows, n_rows) - 1
+
+    envelope = {}
+    for col in time_columns:
+        times = level[col].to_numpy()
+        envelope[col] = np.column_stack([times[starts], times[ends]]).ravel()
+
+    # Pad to whole buckets; padding never wins argmin/argmax
+    positions = np.arange(n_buckets * bucket_rows).reshape(n_buckets, bucket_rows)
+    padding = positions >= n_rows
+    positions = np.minimum(positions, n_rows - 1)
+    rows = np.arange(n_buckets)
+    for col in value_columns:
+        values = level[col].to_numpy()
+        buckets = values[positions].astype(float)
+        lows = np.where(padding | np.isnan(buckets), np.inf, buckets).argmin(axis=1)
+        highs = np.where(padding | np.isnan(buckets), -np.inf, buckets).argmax(axis=1)
+        first = np.minimum(lows, highs)
+        second = np.maximum(lows, highs)
+        pairs = np.column_stack([buckets[rows, first], buckets[rows, second]])
+        envelope[col] = pairs.ravel().astype(values.dtype)
+
+    return pd.DataFrame(envelope)
+
+class LODPyramid:
+    def __init__(self, levels: List[pd.DataFrame], factor: int = 4,
+                 time_column: str = ELAPSED_COLUMN, meta: Optional[dict] = None):
+        """
+        Initialize the pyramid from its levels.
+
+        Args:
+            levels (List[pd.DataFrame]): Level 0 (all samples) first, coarsest last
+            factor (int): Reduction factor between consecutive levels
+            time_column (str): Column used for range queries
+            meta (Optional[dict]): Extra metadata stored with the pyramid
+        """
+        self.levels = levels
+        self.factor = factor
+        self.time_column = time_column
+        self.meta = meta or {}
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, factor: int = 4, min_rows: int = 256,
+              time_column: str = ELAPSED_COLUMN,
+              value_columns: Optional[List[str]] = None) -> "LODPyramid":
+        """
+        Build every level of the pyramid in one pass per level.
+
+        Args:
+            df (pd.DataFrame): Recording sorted by time_column
+            factor (int): Reduction factor between consecutive levels (1x, 4x, 16x, ... for 4)
+            min_rows (int): Stop adding levels once a level would have fewer rows than this
+            time_column (str): Column used for range queries
+            value_columns (Optional[List[str]]): Signals to keep, defaults to the axis and magnitude columns
+
+        Returns:
+            LODPyramid: The built pyramid
+        """
+        time_columns = [col for col in (EPOCH_COLUMN, ELAPSED_COLUMN) if col in df.columns]
+        value_columns = value_columns or [col for col in df.columns if 'axis' in col or col == 'magnitude']
+        levels = [df[time_columns + value_columns].reset_index(drop=True)]
+
+        # Level 1 buckets raw samples; later levels bucket the (min, max) row pairs below
+        bucket_rows = factor
+        while 2 * len(levels[-1]) // bucket_rows >= min_rows:
+            levels.append(_envelope(levels[-1], bucket_rows, time_columns, value_columns))
+            bucket_rows = 2 * factor
+
+        return cls(levels, factor, time_column)
+
+    def level_for(self, width: int, start: Optional[float] = None, end: Optional[float] = None) -> int:
+        """
+        Pick the coarsest level that still has two rows per pixel in the range.
+
+        Args:
+            width (int): Plot width in pixels
+            start (Optional[float]): Start of the range, from the beginning if None
+            end (Optional[float]): End of the range, to the end if None
+
+        Returns:
+            int: Index of the level to draw from
+        """
+        for level in range(len(self.levels) - 1, 0, -1):
+            if self._count(level, start, end) >= 2 * width:
+                return level
+        return 0
+
+    def query(self, width: int, start: Optional[float] = None, end: Optional[float] = None) -> pd.DataFrame:
+        """
+        Rows to draw a time range at the given pixel width.
+
+        Args:
+            width (int): Plot width in pixels
+            start (Optional[float]): Start of the range, from the beginning if None
+            end (Optional[float]): End of the range, to the end if None
+
+        Returns:
+            pd.DataFrame: Time and value columns of the chosen level within the range
+        """
+        level = self.levels[self.level_for(width, start, end)]
+        first, last = self._bounds(level, start, end)
+        return level.iloc[first:last]
+
+    def save(self, directory: Path, **meta) -> None:
+        """
+        Write every level as a column store plus a pyramid.json descriptor.
+
+        Args:
+            directory (Path): Directory for the pyramid
+            **meta: Extra fields stored in pyramid.json
+        """
+        directory = Path(directory)
+        for i, level in enumerate(self.levels):
+            write_columns(level, directory / f"level_{i}")
+
+        self.meta = dict(meta)
+        descriptor = dict(meta, factor=self.factor, time_column=self.time_column, levels=len(self.levels))
+        # The descriptor is replaced last, so readers never see it ahead of its levels
+        fd, tmp_file = tempfile.mkstemp(dir=directory, prefix=f"{PYRAMID_META_FILE}.tmp-")
+        with os.fdopen(fd, "w") as f:
+            json.dump(descriptor, f)
+        os.replace(tmp_file, directory / PYRAMID_META_FILE)
+
+    @classmethod
+    def load(cls, directory: Path) -> Optional["LODPyramid"]:
+        """
+        Memory-map a pyramid written with save().
+
+        Returns:
+            Optional[LODPyramid]: The pyramid, or None if there is no complete one at directory
+        """
+        directory = Path(directory)
+        try:
+            with open(directory / PYRAMID_META_FILE, "r") as f:
+                descriptor = json.load(f)
+            levels = [read_columns(directory / f"level_{i}") for i in range(descriptor.pop("levels"))]
+        except (OSError, ValueError):
+            return None
+        factor = descriptor.pop("factor")
+        time_column = descriptor.pop("time_column")
+        return cls(levels, factor, time_column, meta=descriptor)
+
+    def _bounds(self, level: pd.DataFrame, start: Optional[float], end: Optional[float]):
+        times = level[self.time_column].to_numpy()
+        first = 0 if start is None else np.searchsorted(times, start, side="left")
+        last = len(times) if end is None else np.searchsorted(times, end, side="right")
+        return first, last
+
+    def _count(self, level: int, start: Optional[float], end: Optional[float]) -> int:
+        first, last = self._bounds(self.levels[level], start, end)
+        return max(0, last - first)
@@ -0,0 +1,164 @@
+"""
+Bulk preprocessing of the whole MetaMotion directory.
+Preprocesses every accelerometer/gyroscope session in parallel and writes the
+results to a binary processed store (one memory-mappable .npy file per column),
+together with a level-of-detail pyramid of each sensor for plotting.
+
+Usage:
+    python -m src.preprocess_all --data-dir data/raw/MetaMotion --output data/processed/MetaMotion
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Optional
+
+try:
+    from .csv_cache import read_csv_cached, read_meta, write_columns
+    from .data_processor import ExerciseDataProcessor
+    from .exercise_catalog import ExerciseCatalog, parse_filename
+    from .lod_pyramid import LODPyramid, with_magnitude
+except ImportError:
+    from csv_cache import read_csv_cached, read_meta, write_columns
+    from data_processor import ExerciseDataProcessor
+    from exercise_catalog import ExerciseCatalog, parse_filename
+    from lod_pyramid import LODPyramid, with_magnitude
+
+DEFAULT_PROCESSED_DIR = Path("data/processed/MetaMotion")
+
+def _source_stamp(path: Path) -> Dict:
+    stat = path.stat()
+    return {"file": path.name, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+def is_up_to_date(session_dir: Path, accel_file: Path, gyro_file: Path) -> bool:
+    """Check whether a session was already processed from the current input files"""
+    meta = read_meta(session_dir / "fused")
+    return meta is not None and meta.get("sources") == [_source_stamp(accel_file), _source_stamp(gyro_file)]
+
+def sensor_pyramid(sensor_file: Path, output_dir: Path = DEFAULT_PROCESSED_DIR) -> LODPyramid:
+    """
+    Load the level-of-detail pyramid of a raw recording from the processed store.
+
+    A missing or stale pyramid is built from the recording and stored, so only
+    recordings that were not preprocessed yet pay the full pass.
+
+    Args:
+        sensor_file (Path): Raw accelerometer or gyroscope CSV
+        output_dir (Path): Root of the processed store
+
+    Returns:
+        LODPyramid: The recording's pyramid
+    """
+    sensor_file = Path(sensor_file)
+    record = parse_filename(sensor_file)
+    pyramid_dir = Path(output_dir) / record.session / f"{record.sensor.lower()}_lod"
+    sources = [_source_stamp(sensor_file)]
+
+    pyramid = LODPyramid.load(pyramid_dir)
+    if pyramid is None or pyramid.meta.get("sources") != sources:
+        processor = ExerciseDataProcessor()
+        processor.raw_data = read_csv_cached(sensor_file)
+        pyramid = LODPyramid.build(with_magnitude(processor.preprocess_data()))
+        pyramid.save(pyramid_dir, sources=sources)
+    return pyramid
+
+def process_session(accel_file: Path, gyro_file: Path, session_dir: Path) -> Dict:
+    """
+    Preprocess one accelerometer/gyroscope pair and write it to the processed store.
+
+    Writes "accelerometer", "gyroscope", their level-of-detail pyramids and the
+    time-aligned "fused" table under session_dir. The fused table is written last and records the input
+    files, so an interrupted run is redone on the next one.
+
+    Returns:
+        Dict: Row count, input bytes and elapsed seconds for the session
+    """
+    start = time.perf_counter()
+    processor = ExerciseDataProcessor()
+
+    processed = {}
+    for name, file in (("accelerometer", accel_file), ("gyroscope", gyro_file)):
+        processor.raw_data = read_csv_cached(file)
+        processed[name] = processor.preprocess_data()
+        write_columns(processed[name], session_dir / name)
+        LODPyramid.build(with_magnitude(processed[name])).save(
+            session_dir / f"{name}_lod", sources=[_source_stamp(file)])
+
+    fused = processor.fuse_sensor_data(processed["accelerometer"], processed["gyroscope"])
+    write_columns(fused, session_dir / "fused",
+                  sources=[_source_stamp(accel_file), _source_stamp(gyro_file)])
+
+    return {
+        "rows": sum(len(df) for df in processed.values()),
+        "bytes": accel_file.stat().st_size + gyro_file.stat().st_size,
+        "seconds": time.perf_counter() - start,
+    }
+
+def preprocess_all(data_dir: Path,
+                   output_dir: Path,
+                   max_workers: Optional[int] = None,
+                   force: bool = False) -> Dict:
+    """
+    Preprocess every session in the data directory, using all cores.
+
+    Args:
+        data_dir (Path): Directory with the raw MetaMotion CSVs
+        output_dir (Path): Root of the processed store
+        max_workers (Optional[int]): Worker processes, defaults to the CPU count
+        force (bool): Reprocess sessions even if their inputs are unchanged
+
+    Returns:
+        Dict: Totals for the run
+    """
+    jobs = []
+    skipped = 0
+    for session in ExerciseCatalog(data_dir).sessions():
+        if "Accelerometer" not in session or "Gyroscope" not in session:
+            continue
+        accel_file, gyro_file = session["Accelerometer"].path, session["Gyroscope"].path
+        session_dir = output_dir / session["Accelerometer"].session
+        if not force and is_up_to_date(session_dir, accel_file, gyro_file):
+            skipped += 1
+            continue
+        jobs.append((accel_file, gyro_file, session_dir))
+
+    totals = {"sessions": 0, "skipped": skipped, "failed": 0, "rows": 0, "bytes": 0}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        futures = {executor.submit(process_session, *job): job[2].name for job in jobs}
+        for future in as_completed(futures):
+            session_name = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                totals["failed"] += 1
+                print(f"Error processing {session_name}: {e}")
+                continue
+            totals["sessions"] += 1
+            totals["rows"] += result["rows"]
+            totals["bytes"] += result["bytes"]
+            print(f"{session_name}: {result['rows']} rows in {result['seconds']:.2f}s")
+
+    totals["seconds"] = time.perf_counter() - start
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description="Preprocess all MetaMotion recordings")
+    parser.add_argument("--data-dir", default="data/raw/MetaMotion", help="Directory with raw MetaMotion CSVs")
+    parser.add_argument("--output", default=str(DEFAULT_PROCESSED_DIR), help="Root of the processed store")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="Reprocess unchanged sessions too")
+    args = parser.parse_args()
+
+    totals = preprocess_all(Path(args.data_dir), Path(args.output), args.workers, args.force)
+    seconds = max(totals["seconds"], 1e-9)
+    print(
+        f"Processed {totals['sessions']} sessions ({totals['skipped']} unchanged, {totals['failed']} failed) "
+        f"in {totals['seconds']:.2f}s: {totals['rows'] / seconds:,.0f} rows/s, "
+        f"{totals['bytes'] / seconds / 1e6:.1f} MB/s"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Profile rule engine for personalized workout notes.
+The rules are declared as a table and compiled once into vectorized NumPy checks,
+so notes for a whole batch of profiles cost a handful of array operations.
+"""
+
+import numpy as np
+from typing import Dict, List, NamedTuple
+
+class ProfileRule(NamedTuple):
+    field: str      # "bmi", "age", "experience" or "goals"
+    op: str         # "<", ">", ">=", "==" or "contains"
+    value: object
+    note: str
+
+# Notes are emitted in table order
+DEFAULT_PROFILE_RULES = [
+    # BMI-based notes
+    ProfileRule("bmi", "<", 18.5, "Consider focusing on strength training and muscle building exercises."),
+    ProfileRule("bmi", ">", 25, "Consider incorporating more cardio and endurance exercises."),
+    # Age-based notes
+    ProfileRule("age", ">", 50, "Focus on low-impact exercises and proper form."),
+    # Experience-based notes
+    ProfileRule("experience", "==", "Beginner", "Start with basic exercises and focus on proper form."),
+    ProfileRule("experience", "==", "Advanced", "You can handle more intense and complex exercises."),
+    # Goal-based notes
+    ProfileRule("goals", "contains", "Weight Loss", "Include high-intensity interval training (HIIT) in your routine."),
+    ProfileRule("goals", "contains", "Muscle Gain", "Focus on progressive overload and compound exercises."),
+    ProfileRule("goals", "contains", "Flexibility", "Include stretching and mobility exercises."),
+]
+
+_COMPARISONS = {
+    "<": np.less,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "==": np.equal,
+}
+
+class ProfileRuleEngine:
+    def __init__(self, rules: List[ProfileRule] = DEFAULT_PROFILE_RULES):
+        """
+        Compile a rule table into vectorized checks.
+
+        Args:
+            rules (List[ProfileRule]): Rules to evaluate, in the order their notes are emitted
+        """
+        for rule in rules:
+            if rule.op not in _COMPARISONS and rule.op != "contains":
+                raise ValueError(f"Unknown rule operator: {rule.op}")
+        self.rules = list(rules)
+        self.notes = np.array([rule.note for rule in self.rules], dtype=object)
+
+        # Each goal mentioned by a "contains" rule gets a column in the goal matrix
+        goal_values = [rule.value for rule in self.rules if rule.op == "contains"]
+        self._goal_columns = {goal: i for i, goal in enumerate(dict.fromkeys(goal_values))}
+
+    def evaluate(self, profiles: List[Dict]) -> List[Dict]:
+        """
+        Compute the profile adjustments and personalized notes for many profiles at once.
+
+        Args:
+            profiles (List[Dict]): Complete profiles with weight, height, age, experience and goals
+
+        Returns:
+            List[Dict]: 'profile_adjustments' and 'personalized_notes' for each profile
+        """
+        if not profiles:
+            return []
+
+        columns = self._build_columns(profiles)
+        masks = np.column_stack([self._evaluate_rule(rule, columns) for rule in self.rules])
+
+        adjustments = zip(
+            columns["bmi"].tolist(),
+            (columns["age"] >= 18).tolist(),  # Basic age check
+            columns["experience"].tolist()
+        )
+        return [
+            {
+                'profile_adjustments': {
+                    'bmi': bmi,
+                    'age_appropriate': age_appropriate,
+                    'experience_level': experience,
+                    'goals': profile['goals']
+                },
+                'personalized_notes': self.notes[mask].tolist()
+            }
+            for profile, (bmi, age_appropriate, experience), mask in zip(profiles, adjustments, masks)
+        ]
+
+    def _build_columns(self, profiles: List[Dict]) -> Dict[str, np.ndarray]:
+        """
+        Turn the list of profiles into one array per field.
+        """
+        weight = np.array([profile['weight'] for profile in profiles], dtype=float)
+        height_m = np.array([profile['height'] for profile in profiles], dtype=float) / 100
+
+        goals = np.zeros((len(profiles), len(self._goal_columns)), dtype=bool)
+        for row, profile in enumerate(profiles):
+            for goal in profile['goals']:
+                column = self._goal_columns.get(goal)
+                if column is not None:
+                    goals[row, column] = True
+
+        return {
+            "bmi": weight / (height_m * height_m),
+            "age": np.array([profile['age'] for profile in profiles], dtype=float),
+            "experience": np.array([profile['experience'] for profile in profiles], dtype=object),
+            "goals": goals,
+        }
+
+    def _evaluate_rule(self, rule: ProfileRule, columns: Dict[str, np.ndarray]) -> np.ndarray:
+        if rule.op == "contains":
+            return columns["goals"][:, self._goal_columns[rule.value]]
+        return _COMPARISONS[rule.op](columns[rule.field], rule.value).astype(bool)
@@ -0,0 +1,160 @@
+"""
+Result cache for the workout recommender.
+Serves repeated requests with near-identical preferences without rescoring the index.
+"""
+
+import copy
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+try:
+    from .recommender import WorkoutRecommender
+except ImportError:
+    from recommender import WorkoutRecommender
+
+class RecommendationCache:
+    def __init__(self,
+                 recommender: WorkoutRecommender,
+                 max_size: int = 1024,
+                 ttl: float = 300.0,
+                 decimals: int = 3):
+        """
+        Initialize the recommendation cache.
+
+        Args:
+            recommender (WorkoutRecommender): Recommender to cache results for
+            max_size (int): Maximum number of cached results, least recently used are evicted first
+            ttl (float): Seconds a cached result stays valid
+            decimals (int): Decimals the user vector is rounded to before it is used as a key
+        """
+        self.recommender = recommender
+        self.max_size = max_size
+        self.ttl = ttl
+        self.decimals = decimals
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expiry time, recommendations)
+        self._index_version = recommender.index_version
+        self._lock = threading.Lock()
+
+    def get_recommendations(self, user_preferences: Dict, n_recommendations: int = 5) -> Dict:
+        """
+        Return cached recommendations, computing and storing them on a miss.
+
+        Args:
+            user_preferences (Dict): User's exercise preferences and profile information
+            n_recommendations (int): Number of recommendations to generate
+
+        Returns:
+            Dict: Recommendations in the WorkoutRecommender.get_recommendations format
+        """
+        key = self._make_key(user_preferences, n_recommendations)
+        recommendations = self._lookup(key)
+        if recommendations is None:
+            recommendations = self.recommender.get_recommendations(dict(user_preferences), n_recommendations)
+            self._store(key, recommendations)
+        return copy.deepcopy(recommendations)
+
+    def get_recommendations_batch(self,
+                                  list_of_preferences: List[Dict],
+                                  n_recommendations: int = 5) -> List[Dict]:
+        """
+        Return recommendations for many users, scoring only the cache misses in one batch.
+
+        Args:
+            list_of_preferences (List[Dict]): Preferences and profile information, one dict per user
+            n_recommendations (int): Number of recommendations to generate per user
+
+        Returns:
+            List[Dict]: Recommendations for each user, in input order
+        """
+        keys = [self._make_key(preferences, n_recommendations) for preferences in list_of_preferences]
+        results = [self._lookup(key) for key in keys]
+
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            computed = self.recommender.get_recommendations_batch(
+                [list_of_preferences[i] for i in missing], n_recommendations
+            )
+            for i, recommendations in zip(missing, computed):
+                self._store(keys[i], recommendations)
+                results[i] = recommendations
+
+        return [copy.deepcopy(result) for result in results]
+
+    def stats(self) -> Dict:
+        """
+        Return the hit/miss counters and current size of the cache.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'index_version': self._index_version
+            }
+
+    def clear(self) -> None:
+        """
+        Drop every cached result.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def _make_key(self, user_preferences: Dict, n_recommendations: int) -> Tuple:
+        """
+        Build the cache key from the quantized user vector and the profile fields.
+        """
+        preferences = dict(user_preferences)
+        profile_info = self.recommender._extract_profile(preferences)
+        user_vector = np.round(self.recommender._create_user_vector(preferences).astype(float), self.decimals)
+
+        # Adding 0.0 folds -0.0 into 0.0 so both round to the same key
+        return (
+            self.recommender.index_version,
+            n_recommendations,
+            (user_vector + 0.0).tobytes(),
+            profile_info['weight'],
+            profile_info['height'],
+            profile_info['age'],
+            profile_info['gender'],
+            tuple(profile_info['goals'] or ()),
+            profile_info['experience']
+        )
+
+    def _lookup(self, key: Tuple):
+        with self._lock:
+            self._check_index_version()
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def _store(self, key: Tuple, recommendations: Dict) -> None:
+        with self._lock:
+            self._check_index_version()
+            if key[0] != self._index_version:
+                return  # The index changed while these were being computed
+            self._entries[key] = (time.monotonic() + self.ttl, recommendations)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _check_index_version(self) -> None:
+        """
+        Invalidate every entry once the recommender's index has been reloaded or extended.
+        """
+        if self.recommender.index_version != self._index_version:
+            self._entries.clear()
+            self._index_version = self.recommender.index_version
@@ -3,21 +3,84 @@ Workout recommendation engine module.
 Implements the core recommendation logic for personalized workout plans.
 """
 
+import itertools
+import json
+import shutil
+import tempfile
 import numpy as np
 import pandas as pd
+from pathlib import Path
 from sklearn.preprocessing import StandardScaler
-from sklearn.metrics.pairwise import cosine_similarity
 from typing import List, Dict, Optional
 
+try:
+    from .csv_cache import _swap_in
+    from .data_processor import ELAPSED_COLUMN, EPOCH_COLUMN
+    from .similarity_index import create_index
+    from .profile_rules import ProfileRuleEngine
+except ImportError:
+    from csv_cache import _swap_in
+    from data_processor import ELAPSED_COLUMN, EPOCH_COLUMN
+    from similarity_index import create_index
+    from profile_rules import ProfileRuleEngine
+
+# Timestamps say when a row was recorded, not what the movement looked like,
+# so they are kept as row metadata instead of similarity features
+TIME_COLUMNS = (EPOCH_COLUMN, ELAPSED_COLUMN)
+
+# Feature matrices are stored as float32 to halve their memory footprint
+FEATURE_DTYPE = np.float32
+
+# Process-wide counter so every index state gets a distinct version
+_index_versions = itertools.count(1)
+
+# Profile rules are compiled once and shared by every recommender
+PROFILE_RULES = ProfileRuleEngine()
+
 class WorkoutRecommender:
-    def __init__(self):
+    def __init__(self, index_type: str = "brute", **index_params):
         """
         Initialize the workout recommender.
+        
+        Args:
+            index_type (str): Similarity search backend, "brute" for exact search
+                or "ivf" for approximate search over large catalogs
+            **index_params: Recall/latency knobs for the index, e.g. n_lists and n_probe
         """
         self.exercise_data = None
         self.scaler = StandardScaler()
         self.feature_matrix = None
         self.feature_columns = None  # Store the columns used for similarity
+        self.index_type = index_type
+        self.index_params = index_params
+        self._normalized_features = None  # Row-normalized feature matrix for cosine scoring
+        self._index = None
+        self.index_version = 0  # Changes whenever the indexed rows or their scaling change
+        # Scaler statistics the feature matrix is currently scaled with; they
+        # lag behind the running statistics until append_data() rescales
+        self._applied_mean = None
+        self._applied_scale = None
+        # Preallocated buffers that append_data() grows in chunks
+        self._scaled_buffer = None
+        self._normalized_buffer = None
+        # Set when exercise_data holds only the non-feature columns (a loaded index);
+        # feature values are then rebuilt from the feature matrix for the selected rows
+        self._row_columns = None
+    
+    @property
+    def exercise_data(self) -> Optional[pd.DataFrame]:
+        """
+        Row metadata for the feature matrix, including rows added by append_data().
+        """
+        if self._pending_data:
+            self._exercise_data = pd.concat([self._exercise_data] + self._pending_data, ignore_index=True)
+            self._pending_data = []
+        return self._exercise_data
+    
+    @exercise_data.setter
+    def exercise_data(self, data: Optional[pd.DataFrame]) -> None:
+        self._exercise_data = data
+        self._pending_data = []
     
     def load_data(self, data: pd.DataFrame) -> None:
         """
@@ -27,6 +90,7 @@ class WorkoutRecommender:
             data (pd.DataFrame): Processed exercise data
         """
         self.exercise_data = data
+        self._row_columns = None
         # Prepare feature matrix for similarity calculations
         self._prepare_features()
     
@@ -38,68 +102,212 @@ class WorkoutRecommender:
             raise ValueError("No data loaded. Call load_data first.")
         
         # Select numerical features for similarity calculation
-        self.feature_columns = self.exercise_data.select_dtypes(include=[np.number]).columns.tolist()
-        self.feature_matrix = self.exercise_data[self.feature_columns].copy()
+        self.feature_columns = [col for col in self.exercise_data.select_dtypes(include=[np.number]).columns
+                                if col not in TIME_COLUMNS]
+        features = self.exercise_data[self.feature_columns].to_numpy(dtype=float)
         
-        # Scale features
-        self.feature_matrix = self.scaler.fit_transform(self.feature_matrix)
+        # Scale features in float64, then store as float32
+        self.feature_matrix = self.scaler.fit_transform(features).astype(FEATURE_DTYPE)
+        self._reset_derived_state()
     
-    def _calculate_bmi(self, weight: float, height: float) -> float:
+    def _reset_derived_state(self) -> None:
         """
-        Calculate BMI from weight (kg) and height (cm).
+        Forget everything computed from a previous feature matrix.
         """
-        height_m = height / 100
-        return weight / (height_m * height_m)
+        self._normalized_features = None
+        self._index = None
+        self._applied_mean = self.scaler.mean_.copy()
+        self._applied_scale = self.scaler.scale_.copy()
+        self._scaled_buffer = None
+        self._normalized_buffer = None
+        self.index_version = next(_index_versions)
     
-    def _adjust_recommendations_for_profile(self, recommendations: List[Dict], user_profile: Dict) -> List[Dict]:
+    def append_data(self, data: pd.DataFrame, rescale_threshold: float = 0.1) -> None:
         """
-        Adjust recommendations based on user profile information.
+        Add new exercise rows without refitting the whole index.
+        
+        The scaler's running mean and variance are updated with partial_fit and
+        the new rows are scaled with the statistics already applied to the
+        matrix. Existing rows are only rescaled once the running statistics
+        drift further than rescale_threshold (in applied standard deviations).
+        
+        Args:
+            data (pd.DataFrame): Processed exercise data with the same feature columns
+            rescale_threshold (float): Drift that triggers rescaling the whole matrix
         """
-        bmi = self._calculate_bmi(user_profile['weight'], user_profile['height'])
+        if self._exercise_data is None:
+            self.load_data(data)
+            return
         
-        for rec in recommendations:
-            # Add profile-based adjustments
-            rec['profile_adjustments'] = {
-                'bmi': bmi,
-                'age_appropriate': user_profile['age'] >= 18,  # Basic age check
-                'experience_level': user_profile['experience'],
-                'goals': user_profile['goals']
-            }
-            
-            # Add personalized notes based on profile
-            notes = []
-            
-            # BMI-based notes
-            if bmi < 18.5:
-                notes.append("Consider focusing on strength training and muscle building exercises.")
-            elif bmi > 25:
-                notes.append("Consider incorporating more cardio and endurance exercises.")
-            
-            # Age-based notes
-            if user_profile['age'] > 50:
-                notes.append("Focus on low-impact exercises and proper form.")
+        missing = [col for col in self.feature_columns if col not in data.columns]
+        if missing:
+            raise ValueError(f"Appended data is missing feature columns: {missing}")
+        
+        new_features = data[self.feature_columns].to_numpy(dtype=float)
+        if len(new_features) == 0:
+            return
+        
+        # Update the running statistics (Chan/Welford merge inside partial_fit)
+        self.scaler.partial_fit(new_features)
+        
+        start = len(self.feature_matrix)
+        end = start + len(new_features)
+        self._reserve_rows(end)
+        
+        scaled = (new_features - self._applied_mean) / self._applied_scale
+        self._scaled_buffer[start:end] = scaled
+        self._normalized_buffer[start:end] = _normalize_rows(scaled)
+        self.feature_matrix = self._scaled_buffer[:end]
+        self._normalized_features = self._normalized_buffer[:end]
+        self._pending_data.append(data.drop(columns=self.feature_columns) if self._row_columns else data)
+        self.index_version = next(_index_versions)
+        
+        if self._scaler_drift() > rescale_threshold:
+            self._rescale()
+        elif self._index is not None:
+            self._index.add(self._normalized_features)
+    
+    def _reserve_rows(self, n_rows: int) -> None:
+        """
+        Make sure the feature buffers can hold n_rows, growing them geometrically.
+        """
+        normalized = self._get_normalized_features()
+        if self._scaled_buffer is not None and len(self._scaled_buffer) >= n_rows:
+            return
+        
+        capacity = 0 if self._scaled_buffer is None else len(self._scaled_buffer)
+        capacity = max(n_rows, int(capacity * 1.5), 1024)
+        n_features = len(self.feature_columns)
+        n_current = len(self.feature_matrix)
+        
+        self._scaled_buffer = np.empty((capacity, n_features), dtype=FEATURE_DTYPE)
+        self._scaled_buffer[:n_current] = self.feature_matrix
+        self._normalized_buffer = np.empty((capacity, n_features), dtype=FEATURE_DTYPE)
+        self._normalized_buffer[:n_current] = normalized
+        self.feature_matrix = self._scaled_buffer[:n_current]
+        self._normalized_features = self._normalized_buffer[:n_current]
+    
+    def _scaler_drift(self) -> float:
+        """
+        Largest shift of the running scaler statistics away from the applied ones.
+        """
+        mean_shift = np.abs(self.scaler.mean_ - self._applied_mean) / self._applied_scale
+        scale_shift = np.abs(self.scaler.scale_ / self._applied_scale - 1)
+        return float(max(mean_shift.max(), scale_shift.max()))
+    
+    def _rescale(self) -> None:
+        """
+        Rescale the whole matrix in place to the running scaler statistics.
+        """
+        # x = scaled * applied_scale + applied_mean, rescaled with the new statistics
+        self.feature_matrix *= self._applied_scale / self.scaler.scale_
+        self.feature_matrix += (self._applied_mean - self.scaler.mean_) / self.scaler.scale_
+        self._normalized_features[:] = _normalize_rows(self.feature_matrix)
+        
+        self._applied_mean = self.scaler.mean_.copy()
+        self._applied_scale = self.scaler.scale_.copy()
+        if self._index is not None:
+            # Re-bucket against the trained centroids instead of retraining them
+            self._index.reassign(self._normalized_features)
+    
+    def save(self, path: str) -> None:
+        """
+        Save the fitted recommender so it can be reloaded without refitting.
+        
+        The files are written to a temporary directory next to path, which then
+        replaces path as a whole. Processes serving an older copy keep their
+        memory maps of the replaced files, which are never rewritten in place.
+        
+        Args:
+            path (str): Directory to write the index files to
+        """
+        if self.feature_matrix is None:
+            raise ValueError("No data loaded. Call load_data first.")
+        
+        index_dir = Path(path).resolve()
+        index_dir.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(dir=index_dir.parent, prefix=f"{index_dir.name}.tmp-"))
+        
+        try:
+            np.save(tmp_dir / "feature_matrix.npy", self.feature_matrix.astype(FEATURE_DTYPE, copy=False))
+            np.save(tmp_dir / "normalized_features.npy", self._get_normalized_features().astype(FEATURE_DTYPE, copy=False))
+            np.savez(
+                tmp_dir / "scaler.npz",
+                mean=self.scaler.mean_,
+                scale=self.scaler.scale_,
+                var=self.scaler.var_,
+                n_samples_seen=self.scaler.n_samples_seen_,
+                # The matrix may still be scaled with older statistics than the scaler's
+                applied_mean=self._applied_mean,
+                applied_scale=self._applied_scale
+            )
+            # Only the non-feature columns are pickled; the feature values live in the matrix
+            self.exercise_data.drop(columns=self.feature_columns, errors="ignore").to_pickle(tmp_dir / "row_metadata.pkl")
             
-            # Experience-based notes
-            if user_profile['experience'] == "Beginner":
-                notes.append("Start with basic exercises and focus on proper form.")
-            elif user_profile['experience'] == "Advanced":
-                notes.append("You can handle more intense and complex exercises.")
+            index = self._get_index()
+            index.save(tmp_dir)
+            with open(tmp_dir / "index.json", "w") as f:
+                json.dump({
+                    "feature_columns": self.feature_columns,
+                    "row_columns": self._row_columns or self.exercise_data.columns.tolist(),
+                    "index_type": index.index_type,
+                    "index_params": index.params()
+                }, f)
             
-            # Goal-based notes
-            if "Weight Loss" in user_profile['goals']:
-                notes.append("Include high-intensity interval training (HIIT) in your routine.")
-            if "Muscle Gain" in user_profile['goals']:
-                notes.append("Focus on progressive overload and compound exercises.")
-            if "Flexibility" in user_profile['goals']:
-                notes.append("Include stretching and mobility exercises.")
+            _swap_in(tmp_dir, index_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+    
+    @classmethod
+    def load(cls, path: str, mmap_mode: Optional[str] = "r") -> "WorkoutRecommender":
+        """
+        Load a recommender previously written with save().
+        
+        The feature matrices are memory-mapped read-only by default, so every
+        worker process on a host shares one page-cache copy of them. Only the
+        non-feature row metadata is read into each process.
+        
+        Args:
+            path (str): Directory containing the index files
+            mmap_mode (Optional[str]): Passed to np.load, None reads the matrices into memory
             
-            rec['personalized_notes'] = notes
+        Returns:
+            WorkoutRecommender: Recommender ready to serve recommendations
+        """
+        index_dir = Path(path)
+        with open(index_dir / "index.json", "r") as f:
+            index_info = json.load(f)
+        
+        recommender = cls(index_info.get("index_type", "brute"), **index_info.get("index_params", {}))
+        recommender.feature_columns = index_info["feature_columns"]
+        
+        # Restore the fitted scaler without refitting it on the data
+        scaler_params = np.load(index_dir / "scaler.npz")
+        recommender.scaler.mean_ = scaler_params["mean"]
+        recommender.scaler.scale_ = scaler_params["scale"]
+        recommender.scaler.var_ = scaler_params["var"]
+        recommender.scaler.n_samples_seen_ = scaler_params["n_samples_seen"][()]
+        recommender.scaler.n_features_in_ = len(recommender.feature_columns)
         
-        return recommendations
+        recommender.feature_matrix = np.load(index_dir / "feature_matrix.npy", mmap_mode=mmap_mode)
+        recommender.exercise_data = pd.read_pickle(index_dir / "row_metadata.pkl")
+        recommender._row_columns = index_info["row_columns"]
+        recommender._reset_derived_state()
+        if "applied_mean" in scaler_params:
+            recommender._applied_mean = scaler_params["applied_mean"]
+            recommender._applied_scale = scaler_params["applied_scale"]
+        normalized_file = index_dir / "normalized_features.npy"
+        if normalized_file.exists():
+            recommender._normalized_features = np.load(normalized_file, mmap_mode=mmap_mode)
+        recommender._index = create_index(recommender.index_type, **recommender.index_params).load(
+            index_dir, recommender._get_normalized_features()
+        )
+        return recommender
     
     def get_recommendations(self, 
                           user_preferences: Dict,
-                          n_recommendations: int = 5) -> List[Dict]:
+                          n_recommendations: int = 5) -> Dict:
         """
         Generate workout recommendations based on user preferences and profile.
         
@@ -108,13 +316,83 @@ class WorkoutRecommender:
             n_recommendations (int): Number of recommendations to generate
             
         Returns:
-            List[Dict]: List of recommended exercises with personalized adjustments
+            Dict: The recommended exercises under 'recommendations', plus the
+                'profile_adjustments' and 'personalized_notes' that apply to all of them
         """
         if self.exercise_data is None:
             raise ValueError("No data loaded. Call load_data first.")
         
         # Extract profile information
-        profile_info = {
+        profile_info = self._extract_profile(user_preferences)
+        
+        # Convert remaining user preferences to feature vector
+        user_vector = self._create_user_vector(user_preferences)
+        
+        # Get top N recommendations
+        top_indices, top_scores = self._top_similar(user_vector[np.newaxis, :], n_recommendations)
+        recommendations = self._build_recommendations(top_indices, top_scores)[0]
+        
+        # Apply profile-based adjustments
+        return self._personalize([recommendations], [profile_info])[0]
+    
+    def get_recommendations_batch(self,
+                                  list_of_preferences: List[Dict],
+                                  n_recommendations: int = 5) -> List[Dict]:
+        """
+        Generate workout recommendations for many users at once.
+        
+        All user vectors are scored against the feature matrix in a single
+        matrix multiply, so this is much cheaper than calling
+        get_recommendations once per user.
+        
+        Args:
+            list_of_preferences (List[Dict]): Preferences and profile information, one dict per user
+            n_recommendations (int): Number of recommendations to generate per user
+            
+        Returns:
+            List[Dict]: Recommendations for each user in the get_recommendations format, in input order
+        """
+        if self.exercise_data is None:
+            raise ValueError("No data loaded. Call load_data first.")
+        if not list_of_preferences:
+            return []
+        
+        # Work on copies so the caller's dicts are left untouched
+        list_of_preferences = [dict(preferences) for preferences in list_of_preferences]
+        profiles = [self._extract_profile(preferences) for preferences in list_of_preferences]
+        user_matrix = np.vstack([self._create_user_vector(preferences) for preferences in list_of_preferences])
+        
+        top_indices, top_scores = self._top_similar(user_matrix, n_recommendations)
+        batch_recommendations = self._build_recommendations(top_indices, top_scores)
+        
+        return self._personalize(batch_recommendations, profiles)
+    
+    def _personalize(self, batch_recommendations: List[List[Dict]], profiles: List[Dict]) -> List[Dict]:
+        """
+        Wrap each user's recommendations with their profile adjustments, sent once per response.
+        The profile rules are evaluated for all complete profiles in one vectorized pass.
+        """
+        results = [
+            {
+                'recommendations': recommendations,
+                'profile_adjustments': None,
+                'personalized_notes': []
+            }
+            for recommendations in batch_recommendations
+        ]
+        
+        complete = [i for i, profile_info in enumerate(profiles)
+                    if all(v is not None for v in profile_info.values())]
+        adjustments = PROFILE_RULES.evaluate([profiles[i] for i in complete])
+        for i, profile_adjustments in zip(complete, adjustments):
+            results[i].update(profile_adjustments)
+        return results
+    
+    def _extract_profile(self, user_preferences: Dict) -> Dict:
+        """
+        Remove the profile fields from the preferences and return them separately.
+        """
+        return {
             'weight': user_preferences.pop('weight', None),
             'height': user_preferences.pop('height', None),
             'age': user_preferences.pop('age', None),
@@ -122,29 +400,71 @@ class WorkoutRecommender:
             'goals': user_preferences.pop('goals', []),
             'experience': user_preferences.pop('experience', 'Beginner')
         }
+    
+    def _get_normalized_features(self) -> np.ndarray:
+        """
+        Return the feature matrix with unit-length rows, computed once per index.
+        """
+        if self._normalized_features is None:
+            self._normalized_features = _normalize_rows(self.feature_matrix)
+        return self._normalized_features
+    
+    def _get_index(self):
+        """
+        Return the similarity index, building it over the normalized features on first use.
+        """
+        if self._index is None:
+            self._index = create_index(self.index_type, **self.index_params)
+            self._index.fit(self._get_normalized_features())
+        return self._index
+    
+    def _top_similar(self, user_matrix: np.ndarray, n_recommendations: int):
+        """
+        Find the most similar rows for each user vector by cosine similarity.
+        The search is exact for the brute-force index and approximate for IVF.
         
-        # Convert remaining user preferences to feature vector
-        user_vector = self._create_user_vector(user_preferences)
-        
-        # Calculate similarity scores
-        similarities = cosine_similarity([user_vector], self.feature_matrix)[0]
-        
-        # Get top N recommendations
-        top_indices = np.argsort(similarities)[-n_recommendations:][::-1]
+        Args:
+            user_matrix (np.ndarray): One user vector per row, in raw feature units
+            n_recommendations (int): Number of rows to return per user
+            
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Row indices and similarity scores, best first
+        """
+        # Scale with the statistics the feature matrix was scaled with, so both live in one space;
+        # features the user did not provide sit at the mean and do not sway the ranking
+        scaled = np.nan_to_num((user_matrix - self._applied_mean) / self._applied_scale)
+        return self._get_index().search(_normalize_rows(scaled), n_recommendations)
+    
+    def _build_recommendations(self, indices: np.ndarray, scores: np.ndarray) -> List[List[Dict]]:
+        """
+        Turn the selected row indices into recommendation dicts.
         
-        recommendations = []
-        for idx in top_indices:
-            exercise = self.exercise_data.iloc[idx].to_dict()
-            recommendations.append({
-                'exercise': exercise,
-                'similarity_score': similarities[idx]
-            })
+        All rows for all users are gathered with a single take() and converted
+        column-wise, instead of one iloc lookup per recommendation.
         
-        # Apply profile-based adjustments
-        if all(v is not None for v in profile_info.values()):
-            recommendations = self._adjust_recommendations_for_profile(recommendations, profile_info)
+        Args:
+            indices (np.ndarray): Selected row indices, one row per user
+            scores (np.ndarray): Similarity scores matching the indices
+            
+        Returns:
+            List[List[Dict]]: Recommendations for each user
+        """
+        n_users, k = indices.shape
+        rows = self.exercise_data.take(indices.ravel())
+        if self._row_columns:
+            # Undo the scaling for just the selected rows of the feature matrix
+            raw = self.feature_matrix[indices.ravel()] * self._applied_scale + self._applied_mean
+            rows = rows.assign(**dict(zip(self.feature_columns, raw.T)))[self._row_columns]
+        exercises = rows.to_dict(orient="records")
+        scores = scores.ravel().tolist()
         
-        return recommendations
+        return [
+            [
+                {'exercise': exercises[i], 'similarity_score': scores[i]}
+                for i in range(user * k, (user + 1) * k)
+            ]
+            for user in range(n_users)
+        ]
     
     def _create_user_vector(self, preferences: Dict) -> np.ndarray:
         """
@@ -154,10 +474,15 @@ class WorkoutRecommender:
             preferences (Dict): User's exercise preferences
             
         Returns:
-            np.ndarray: Feature vector representing user preferences
+            np.ndarray: Feature vector representing user preferences, NaN where a feature was not provided
         """
         # Ensure the user vector matches the feature matrix columns
-        user_vector = []
-        for col in self.feature_columns:
-            user_vector.append(preferences.get(col, 0))  # Default to 0 if not provided
-        return np.array(user_vector) 
\ No newline at end of file
+        return np.array([preferences.get(col, np.nan) for col in self.feature_columns], dtype=float)
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    Scale each row to unit length, leaving all-zero rows as they are.
+    """
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
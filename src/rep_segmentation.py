@@ -0,0 +1,383 @@
+"""
+Repetition and set segmentation of exercise recordings.
+Detects reps as excursions of the smoothed movement magnitude above a
+hysteresis band and groups them into sets by the pauses between them. A whole
+batch of recordings is processed in one vectorized pass over the concatenated
+signals; StreamingRepCounter does the same for a live stream, chunk by chunk.
+"""
+
+import copy
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+# Per-recording features derived from the detected reps
+REP_FEATURES = [
+    "rep_count", "set_count", "reps_per_set", "rep_interval_s",
+    "rep_interval_cv", "rep_duration_s", "cadence_rpm", "rep_amplitude",
+]
+
+class RepSegmenter:
+    def __init__(self,
+                 sample_rate: float = 12.5,
+                 smoothing_s: float = 0.4,
+                 high_z: float = 0.5,
+                 low_z: float = 0.0,
+                 min_rise: float = 0.1,
+                 refractory_s: float = 0.8,
+                 set_gap_s: float = 10.0):
+        """
+        Initialize the segmenter.
+
+        Args:
+            sample_rate (float): Sampling rate of the signals in Hz
+            smoothing_s (float): Width of the moving-average smoothing window in seconds
+            high_z (float): A rep starts when the signal rises this many standard deviations above its mean
+            low_z (float): A rep ends only once the signal falls below this many standard deviations above its mean
+            min_rise (float): Smallest rise above the mean that can start a rep, in signal units (g for
+                the accelerometer magnitude), so sensor noise during rests is not counted
+            refractory_s (float): Excursions closer than this to the previous one are merged into the same rep
+            set_gap_s (float): A pause longer than this between rep peaks starts a new set
+        """
+        if high_z < low_z:
+            raise ValueError("high_z must not be below low_z")
+        self.sample_rate = sample_rate
+        self.smoothing_s = smoothing_s
+        self.high_z = high_z
+        self.low_z = low_z
+        self.min_rise = min_rise
+        self.refractory_s = refractory_s
+        self.set_gap_s = set_gap_s
+
+    def segment(self, signals: List[np.ndarray]) -> pd.DataFrame:
+        """
+        Detect the reps in a batch of recordings.
+
+        Args:
+            signals (List[np.ndarray]): Movement magnitude of each recording
+
+        Returns:
+            pd.DataFrame: One row per rep with its recording, set, start/peak/end
+            sample (relative to the recording), peak time, duration and amplitude
+        """
+        lengths = np.array([len(signal) for signal in signals], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+        n_samples = int(lengths.sum())
+        if n_samples == 0:
+            return self._reps_frame(*(np.empty(0, dtype=np.int64) for _ in range(5)), np.empty(0))
+
+        recording = np.repeat(np.arange(len(signals)), lengths)
+        values = np.concatenate([np.asarray(signal, dtype=float) for signal in signals])
+        non_empty = lengths > 0
+        first_sample, end_sample = offsets[non_empty], (offsets + lengths)[non_empty]
+
+        # Gaps take the recording's mean so they do not look like movement
+        missing = np.isnan(values)
+        if missing.any():
+            valid = ~missing
+            sums = np.bincount(recording[valid], values[valid], minlength=len(signals))
+            counts = np.bincount(recording[valid], minlength=len(signals))
+            values[missing] = (sums / np.maximum(counts, 1))[recording[missing]]
+
+        smooth = self._smooth(values, recording, offsets, lengths)
+
+        # Hysteresis band from each recording's mean and standard deviation
+        counts = np.maximum(lengths, 1)
+        mean = np.bincount(recording, smooth, minlength=len(signals)) / counts
+        var = np.bincount(recording, np.square(smooth - mean[recording]), minlength=len(signals)) / counts
+        std = np.sqrt(var)
+        high = (mean + np.maximum(self.high_z * std, self.min_rise))[recording]
+        low = (mean + self.low_z * std)[recording]
+
+        # +1 above the band, -1 below it; carrying the last event forward gives the
+        # hysteresis state. Every recording starts from an event, so none leaks over.
+        events = np.zeros(n_samples, dtype=np.int8)
+        events[smooth > high] = 1
+        events[smooth < low] = -1
+        events[first_sample] = np.where(events[first_sample] == 1, 1, -1)
+        positions = np.arange(n_samples)
+        last_event = np.maximum.accumulate(np.where(events != 0, positions, 0))
+        active = events[last_event] == 1
+
+        previous = np.concatenate([[False], active[:-1]])
+        previous[first_sample] = False
+        following = np.concatenate([active[1:], [False]])
+        following[end_sample - 1] = False
+        run_starts = np.flatnonzero(active & ~previous)
+        run_ends = np.flatnonzero(active & ~following) + 1
+
+        if len(run_starts) == 0:
+            return self._reps_frame(*(np.empty(0, dtype=np.int64) for _ in range(5)), np.empty(0))
+
+        # Merge excursions within the refractory period of the previous one
+        refractory = int(round(self.refractory_s * self.sample_rate))
+        new_rep = np.ones(len(run_starts), dtype=bool)
+        new_rep[1:] = ((run_starts[1:] - run_ends[:-1] >= refractory)
+                       | (recording[run_starts[1:]] != recording[run_starts[:-1]]))
+        rep_starts = run_starts[new_rep]
+        rep_ends = run_ends[np.append(np.flatnonzero(new_rep)[1:] - 1, len(run_ends) - 1)]
+
+        # Peak of every rep: max over [start, end), then the first sample reaching it
+        padded = np.append(smooth, -np.inf)
+        peaks = np.maximum.reduceat(padded, np.column_stack([rep_starts, rep_ends]).ravel())[::2]
+        marks = np.zeros(n_samples + 1, dtype=np.int64)
+        marks[rep_starts] += 1
+        marks[rep_ends] -= 1
+        in_rep = np.cumsum(marks)[:-1] > 0
+        start_marks = np.zeros(n_samples, dtype=np.int64)
+        start_marks[rep_starts] = 1
+        rep_id = np.maximum(np.cumsum(start_marks) - 1, 0)
+        candidates = np.flatnonzero(in_rep & (smooth == peaks[rep_id]))
+        _, first = np.unique(rep_id[candidates], return_index=True)
+        peak_samples = candidates[first]
+
+        rep_recording = recording[rep_starts]
+        amplitude = peaks - mean[rep_recording]
+
+        # A long pause between peaks, or a new recording, starts a new set
+        new_recording = np.ones(len(rep_starts), dtype=bool)
+        new_recording[1:] = rep_recording[1:] != rep_recording[:-1]
+        new_set = new_recording.copy()
+        new_set[1:] |= np.diff(peak_samples) > self.set_gap_s * self.sample_rate
+        set_global = np.cumsum(new_set) - 1
+        recording_first_rep = np.flatnonzero(new_recording)[np.cumsum(new_recording) - 1]
+        rep_set = set_global - set_global[recording_first_rep]
+
+        local = offsets[rep_recording]
+        return self._reps_frame(rep_recording, rep_set, rep_starts - local, peak_samples - local,
+                                rep_ends - local, amplitude)
+
+    def features(self, signals: List[np.ndarray]) -> pd.DataFrame:
+        """
+        Rep counts and tempo statistics for a batch of recordings.
+
+        Args:
+            signals (List[np.ndarray]): Movement magnitude of each recording
+
+        Returns:
+            pd.DataFrame: One row of REP_FEATURES per recording, 0 where undefined
+        """
+        return self.summarize(self.segment(signals), len(signals))
+
+    def summarize(self, reps: pd.DataFrame, n_recordings: int) -> pd.DataFrame:
+        """
+        Aggregate a rep table from segment() into per-recording features.
+
+        Args:
+            reps (pd.DataFrame): Reps as returned by segment()
+            n_recordings (int): Number of recordings the reps were detected in
+
+        Returns:
+            pd.DataFrame: One row of REP_FEATURES per recording
+        """
+        recording = reps["recording"].to_numpy()
+        rep_set = reps["set"].to_numpy()
+        peak_s = reps["peak_s"].to_numpy()
+
+        rep_count = np.bincount(recording, minlength=n_recordings)
+        set_count = np.zeros(n_recordings)
+        np.maximum.at(set_count, recording, rep_set + 1)
+
+        # Peak-to-peak intervals between consecutive reps of the same set
+        same_set = (recording[1:] == recording[:-1]) & (rep_set[1:] == rep_set[:-1])
+        intervals = np.diff(peak_s)[same_set]
+        interval_recording = recording[1:][same_set]
+        n_intervals = np.bincount(interval_recording, minlength=n_recordings)
+        interval_mean = _safe_divide(np.bincount(interval_recording, intervals, minlength=n_recordings), n_intervals)
+        interval_var = _safe_divide(
+            np.bincount(interval_recording, np.square(intervals - interval_mean[interval_recording]), minlength=n_recordings),
+            n_intervals
+        )
+
+        return pd.DataFrame({
+            "rep_count": rep_count,
+            "set_count": set_count,
+            "reps_per_set": _safe_divide(rep_count, set_count),
+            "rep_interval_s": interval_mean,
+            "rep_interval_cv": _safe_divide(np.sqrt(interval_var), interval_mean),
+            "rep_duration_s": _safe_divide(np.bincount(recording, reps["duration_s"].to_numpy(), minlength=n_recordings), rep_count),
+            "cadence_rpm": _safe_divide(60.0, interval_mean),
+            "rep_amplitude": _safe_divide(np.bincount(recording, reps["amplitude"].to_numpy(), minlength=n_recordings), rep_count),
+        }, columns=REP_FEATURES).astype(float)
+
+    def _smooth(self, values: np.ndarray, recording: np.ndarray, offsets: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        """
+        Centered moving average from a cumulative sum, clipped at recording edges.
+        """
+        half = max(int(round(self.smoothing_s * self.sample_rate / 2)), 0)
+        cumulative = np.concatenate([[0.0], np.cumsum(values)])
+        positions = np.arange(len(values))
+        lo = np.maximum(positions - half, offsets[recording])
+        hi = np.minimum(positions + half + 1, (offsets + lengths)[recording])
+        return (cumulative[hi] - cumulative[lo]) / (hi - lo)
+
+    def _reps_frame(self, recording, rep_set, start, peak, end, amplitude) -> pd.DataFrame:
+        return pd.DataFrame({
+            "recording": recording,
+            "set": rep_set,
+            "start": start,
+            "peak": peak,
+            "end": end,
+            "peak_s": peak / self.sample_rate,
+            "duration_s": (end - start) / self.sample_rate,
+            "amplitude": amplitude,
+        })
+
+def _safe_divide(numerator, denominator) -> np.ndarray:
+    """Elementwise division that yields 0 where the denominator is 0"""
+    numerator = np.broadcast_to(np.asarray(numerator, dtype=float), np.shape(denominator))
+    denominator = np.asarray(denominator, dtype=float)
+    result = np.zeros_like(denominator)
+    np.divide(numerator, denominator, out=result, where=denominator != 0)
+    return result
+
+class StreamingRepCounter:
+    def __init__(self, segmenter: Optional[RepSegmenter] = None):
+        """
+        Count reps in a live stream, one chunk of samples at a time.
+
+        Uses the thresholds of a RepSegmenter, but since future samples are not
+        known yet it smooths with a trailing moving average and draws the
+        hysteresis band from the running mean and standard deviation. A rep's
+        tempo statistics are final once the next rep starts.
+
+        Args:
+            segmenter (Optional[RepSegmenter]): Parameters to use, defaults to RepSegmenter()
+        """
+        self.segmenter = segmenter or RepSegmenter()
+        sample_rate = self.segmenter.sample_rate
+        self._window = max(int(round(self.segmenter.smoothing_s * sample_rate / 2)), 0) * 2 + 1
+        self._refractory = int(round(self.segmenter.refractory_s * sample_rate))
+        self._set_gap = self.segmenter.set_gap_s * sample_rate
+        self._tail = np.empty(0)  # Last raw samples, for the moving average
+        self._position = 0  # Samples seen so far
+
+        # Running mean and sum of squared deviations of the smoothed signal
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+
+        self._active = False
+        self._last_run_end = None
+        self._in_rep = False
+        self._rep_peak = -np.inf
+        self._rep_peak_at = None
+        self._last_peak_at = None
+
+        self.rep_count = 0
+        self.set_count = 0
+        self._active_samples = 0
+        self._amplitude_sum = 0.0
+        self._intervals = 0
+        self._interval_sum = 0.0
+        self._interval_sq_sum = 0.0
+
+    def update(self, values: np.ndarray) -> int:
+        """
+        Feed the next chunk of the magnitude signal.
+
+        Args:
+            values (np.ndarray): New samples, in order
+
+        Returns:
+            int: Reps started within this chunk
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return 0
+        reps_before = self.rep_count
+
+        # Trailing moving average, continuing from the previous chunk
+        extended = np.concatenate([self._tail, values])
+        cumulative = np.concatenate([[0.0], np.cumsum(extended)])
+        hi = np.arange(len(self._tail) + 1, len(extended) + 1)
+        lo = np.maximum(hi - self._window, 0)
+        smooth = (cumulative[hi] - cumulative[lo]) / (hi - lo)
+        self._tail = extended[len(extended) - (self._window - 1):] if self._window > 1 else np.empty(0)
+
+        # Fold the chunk into the running statistics (parallel variance update)
+        chunk_mean = smooth.mean()
+        delta = chunk_mean - self._mean
+        total = self._count + len(smooth)
+        self._m2 += np.square(smooth - chunk_mean).sum() + delta * delta * self._count * len(smooth) / total
+        self._mean += delta * len(smooth) / total
+        self._count = total
+        std = np.sqrt(self._m2 / self._count)
+        high = self._mean + max(self.segmenter.high_z * std, self.segmenter.min_rise)
+        low = self._mean + self.segmenter.low_z * std
+
+        # Hysteresis state, starting from the state the last chunk ended in
+        events = np.zeros(len(smooth) + 1, dtype=np.int8)
+        events[0] = 1 if self._active else -1
+        events[1:][smooth > high] = 1
+        events[1:][smooth < low] = -1
+        positions = np.arange(len(events))
+        state = events[np.maximum.accumulate(np.where(events != 0, positions, 0))] == 1
+        active, previous = state[1:], state[:-1]
+        run_starts = np.flatnonzero(active & ~previous)
+        run_ends = np.flatnonzero(~active & previous)
+        self._active = bool(active[-1])
+        self._active_samples += int(active.sum())
+
+        # Walk the excursions of this chunk; there are only a few per chunk
+        masked = np.where(active, smooth, -np.inf)
+        bounds = np.unique(np.concatenate([[0], run_starts, [len(smooth)]]))
+        for seg_start, seg_end in zip(bounds[:-1], bounds[1:]):
+            if active[seg_start] and not (previous[seg_start]):
+                start = self._position + seg_start
+                if not self._in_rep or self._last_run_end is None or start - self._last_run_end >= self._refractory:
+                    self._finish_rep()
+                    self._in_rep = True
+                    self.rep_count += 1
+            peak = seg_start + int(masked[seg_start:seg_end].argmax())
+            if self._in_rep and masked[peak] > self._rep_peak:
+                self._rep_peak = masked[peak]
+                self._rep_peak_at = self._position + peak
+            end = np.searchsorted(run_ends, seg_start, side="right")
+            if end < len(run_ends) and run_ends[end] <= seg_end:
+                self._last_run_end = self._position + run_ends[end]
+
+        self._position += len(smooth)
+        return self.rep_count - reps_before
+
+    def features(self) -> Dict[str, float]:
+        """
+        Current rep count and tempo statistics, with the rep in progress included.
+
+        Returns:
+            Dict[str, float]: Values for REP_FEATURES
+        """
+        snapshot = copy.copy(self)
+        snapshot._finish_rep()
+        interval_mean = _safe_divide(snapshot._interval_sum, snapshot._intervals)[()]
+        interval_var = max(_safe_divide(snapshot._interval_sq_sum, snapshot._intervals)[()] - interval_mean ** 2, 0.0)
+        sample_rate = self.segmenter.sample_rate
+        features = {
+            "rep_count": snapshot.rep_count,
+            "set_count": snapshot.set_count,
+            "reps_per_set": _safe_divide(snapshot.rep_count, snapshot.set_count)[()],
+            "rep_interval_s": interval_mean,
+            "rep_interval_cv": _safe_divide(np.sqrt(interval_var), interval_mean)[()],
+            "rep_duration_s": _safe_divide(snapshot._active_samples / sample_rate, snapshot.rep_count)[()],
+            "cadence_rpm": _safe_divide(60.0, interval_mean)[()],
+            "rep_amplitude": _safe_divide(snapshot._amplitude_sum, snapshot.rep_count)[()],
+        }
+        return {name: float(value) for name, value in features.items()}
+
+    def _finish_rep(self) -> None:
+        """Close the rep in progress and add its peak to the set and tempo statistics"""
+        if not self._in_rep or self._rep_peak_at is None:
+            return
+        self._amplitude_sum += self._rep_peak - self._mean
+        if self._last_peak_at is None or self._rep_peak_at - self._last_peak_at > self._set_gap:
+            self.set_count += 1
+        else:
+            interval = (self._rep_peak_at - self._last_peak_at) / self.segmenter.sample_rate
+            self._intervals += 1
+            self._interval_sum += interval
+            self._interval_sq_sum += interval * interval
+        self._last_peak_at = self._rep_peak_at
+        self._in_rep = False
+        self._rep_peak = -np.inf
+        self._rep_peak_at = None
@@ -0,0 +1,148 @@
+"""
+Replay recorded MetaMotion sessions into the live ingest endpoint.
+Stands in for MetaWear devices: streams an exercise's accelerometer and
+gyroscope CSVs over /ws/ingest in time order, optionally as many concurrent
+sessions, and prints the updates the server pushes back.
+
+Usage:
+    python -m src.replay_client --exercise bench --url ws://localhost:8000 --speed 10
+    python -m src.replay_client --exercise squat --sessions 200 --speed 20 --quiet
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import websockets
+
+try:
+    from .csv_cache import read_csv_cached
+    from .data_processor import ELAPSED_COLUMN
+    from .exercise_catalog import ExerciseCatalog
+except ImportError:
+    from csv_cache import read_csv_cached
+    from data_processor import ELAPSED_COLUMN
+    from exercise_catalog import ExerciseCatalog
+
+def load_recording(data_dir: Path, exercise: str) -> Dict[str, np.ndarray]:
+    """
+    Load the latest recording of an exercise as [elapsed, x, y, z] rows per sensor.
+    """
+    accel_file, gyro_file = ExerciseCatalog(data_dir).latest_pair(exercise)
+    if accel_file is None or gyro_file is None:
+        raise FileNotFoundError(f"No accelerometer/gyroscope recording of '{exercise}' in {data_dir}")
+    recording = {}
+    for sensor, file in (("accelerometer", accel_file), ("gyroscope", gyro_file)):
+        df = read_csv_cached(file)
+        columns = [ELAPSED_COLUMN] + [col for col in df.columns if 'axis' in col]
+        recording[sensor] = df[columns].to_numpy(dtype=float)
+    return recording
+
+def batches(recording: Dict[str, np.ndarray], batch_s: float) -> List[Tuple[float, str, list]]:
+    """
+    Cut the recording into time slices of batch_s seconds.
+
+    Returns:
+        List[Tuple[float, str, list]]: (slice end time, sensor, rows) in send order,
+        gyroscope before accelerometer within a slice
+    """
+    end = max(rows[-1, 0] for rows in recording.values() if len(rows))
+    edges = np.arange(batch_s, end + batch_s, batch_s)
+    messages = []
+    bounds = {sensor: np.searchsorted(rows[:, 0], edges, side="right") for sensor, rows in recording.items()}
+    starts = {sensor: 0 for sensor in recording}
+    for i, edge in enumerate(edges):
+        for sensor in ("gyroscope", "accelerometer"):
+            stop = bounds[sensor][i]
+            if stop > starts[sensor]:
+                messages.append((float(edge), sensor, recording[sensor][starts[sensor]:stop].tolist()))
+                starts[sensor] = stop
+    return messages
+
+async def replay_session(url: str, session_id: str, messages: List[Tuple[float, str, list]],
+                         profile: Dict, speed: float, push_interval: float, quiet: bool) -> Dict:
+    """Stream one session in (scaled) real time and collect the server's updates"""
+    result = {"samples": 0, "updates": 0, "errors": 0, "last_update": None}
+
+    async with websockets.connect(f"{url}/ws/ingest/{session_id}?push_interval={push_interval}") as websocket:
+        async def receive():
+            async for raw in websocket:
+                message = json.loads(raw)
+                if message["type"] == "error":
+                    result["errors"] += 1
+                    print(f"{session_id}: error: {message['detail']}")
+                    continue
+                result["updates"] += 1
+                result["last_update"] = message
+                if not quiet:
+                    stats, reps = message["stats"], message["reps"]
+                    print(f"{session_id}: {stats['samples']} samples, {stats['windows']} windows, "
+                          f"{reps['rep_count']:.0f} reps, {reps['cadence_rpm']:.1f} reps/min")
+
+        receiver = asyncio.create_task(receive())
+        if profile:
+            await websocket.send(json.dumps({"type": "profile", "profile": profile}))
+
+        start = time.monotonic()
+        for send_at, sensor, rows in messages:
+            delay = start + send_at / speed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await websocket.send(json.dumps({"type": "samples", "sensor": sensor, "samples": rows}))
+            result["samples"] += len(rows)
+
+        # Ask for a final update and wait for it
+        updates = result["updates"]
+        await websocket.send(json.dumps({"type": "flush"}))
+        deadline = time.monotonic() + 5
+        while result["updates"] == updates and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        receiver.cancel()
+    return result
+
+async def replay(url: str, messages: List[Tuple[float, str, list]], sessions: int,
+                 profile: Dict, speed: float, push_interval: float, quiet: bool) -> List[Dict]:
+    return await asyncio.gather(*(
+        replay_session(url, f"replay-{i}", messages, profile, speed, push_interval, quiet or i > 0)
+        for i in range(sessions)
+    ))
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded sessions into the live ingest endpoint")
+    parser.add_argument("--exercise", required=True, help="Exercise to replay, e.g. bench")
+    parser.add_argument("--data-dir", default="data/raw/MetaMotion", help="Directory with raw MetaMotion CSVs")
+    parser.add_argument("--url", default="ws://localhost:8000", help="Base WebSocket URL of the API")
+    parser.add_argument("--speed", type=float, default=1.0, help="Playback speed (1 = real time)")
+    parser.add_argument("--batch", type=float, default=0.4, help="Seconds of samples per message")
+    parser.add_argument("--sessions", type=int, default=1, help="Concurrent sessions to simulate")
+    parser.add_argument("--push-interval", type=float, default=2.0, help="Seconds between server updates")
+    parser.add_argument("--profile", default=None, help="JSON file with a user profile to personalize updates")
+    parser.add_argument("--quiet", action="store_true", help="Only print the summary")
+    args = parser.parse_args()
+
+    profile = {}
+    if args.profile:
+        with open(args.profile, "r") as f:
+            profile = json.load(f)
+
+    messages = batches(load_recording(Path(args.data_dir), args.exercise), args.batch)
+    start = time.perf_counter()
+    results = asyncio.run(replay(args.url, messages, args.sessions, profile, args.speed,
+                                 args.push_interval, args.quiet))
+    seconds = time.perf_counter() - start
+
+    samples = sum(result["samples"] for result in results)
+    updates = sum(result["updates"] for result in results)
+    errors = sum(result["errors"] for result in results)
+    print(f"Replayed {args.sessions} sessions in {seconds:.2f}s: {samples / seconds:,.0f} samples/s, "
+          f"{updates} updates, {errors} errors")
+    last = results[0]["last_update"]
+    if last and last["recommendations"]:
+        print(json.dumps(last["recommendations"], indent=2, default=str))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+Similarity search indexes for the workout recommender.
+Provides exact brute-force search and an approximate IVF index for large catalogs.
+"""
+
+import numpy as np
+from pathlib import Path
+from typing import Optional, Tuple
+
+class BruteForceIndex:
+    """
+    Exact cosine search that scores every row of the feature matrix.
+    """
+    index_type = "brute"
+
+    def __init__(self):
+        self.features = None
+
+    def fit(self, features: np.ndarray) -> "BruteForceIndex":
+        """
+        Build the index over row-normalized features.
+
+        Args:
+            features (np.ndarray): Feature matrix with unit-length rows
+        """
+        self.features = features
+        return self
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k most similar rows for each query.
+
+        Args:
+            queries (np.ndarray): Unit-length query vectors, one per row
+            k (int): Number of rows to return per query
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Row indices and similarity scores, best first
+        """
+        similarities = queries.astype(self.features.dtype, copy=False) @ self.features.T
+        return _top_k(similarities, k)
+
+    def add(self, features: np.ndarray) -> None:
+        """
+        Pick up rows appended to the end of the feature matrix.
+
+        Args:
+            features (np.ndarray): The full feature matrix, including the new rows
+        """
+        self.features = features
+
+    def reassign(self, features: np.ndarray) -> None:
+        """Pick up rows that were rescaled in place"""
+        self.features = features
+
+    def params(self) -> dict:
+        return {}
+
+    def save(self, path: Path) -> None:
+        """Nothing to persist, the index is rebuilt from the feature matrix"""
+
+    def load(self, path: Path, features: np.ndarray) -> "BruteForceIndex":
+        return self.fit(features)
+
+class IVFIndex:
+    """
+    Approximate cosine search over an inverted file of k-means buckets.
+
+    Rows are clustered around n_lists centroids. A query only scores the rows
+    in its n_probe closest buckets, so the cost grows with n_probe * N / n_lists
+    instead of N. Raise n_probe for better recall, raise n_lists for lower latency.
+    """
+    index_type = "ivf"
+
+    def __init__(self,
+                 n_lists: Optional[int] = None,
+                 n_probe: int = 8,
+                 n_iter: int = 10,
+                 max_training_rows: int = 100000,
+                 random_state: int = 0):
+        """
+        Initialize the IVF index.
+
+        Args:
+            n_lists (int): Number of buckets, defaults to sqrt of the number of rows
+            n_probe (int): Number of buckets scanned per query
+            n_iter (int): Number of k-means iterations
+            max_training_rows (int): Rows sampled to train the centroids
+            random_state (int): Seed for centroid initialization and sampling
+        """
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.max_training_rows = max_training_rows
+        self.random_state = random_state
+        self.features = None
+        self.centroids = None
+        self.list_rows = None     # Row indices grouped by bucket
+        self.list_offsets = None  # Start of each bucket in list_rows
+        # Rows added after the last full assignment, as per-bucket chunks of row indices
+        self._overflow = None
+        self._overflow_sizes = None
+        self.n_rows = 0           # Rows assigned to buckets so far
+
+    def fit(self, features: np.ndarray) -> "IVFIndex":
+        """
+        Train the bucket centroids and assign every row to its bucket.
+
+        Args:
+            features (np.ndarray): Feature matrix with unit-length rows
+        """
+        self.features = features
+        n_rows = len(features)
+        rng = np.random.default_rng(self.random_state)
+        if n_rows > self.max_training_rows:
+            training = features[rng.choice(n_rows, self.max_training_rows, replace=False)]
+        else:
+            training = features
+
+        # k-means seeds its centroids with distinct training rows, so there cannot be more buckets than those
+        n_lists = self.n_lists or int(np.sqrt(n_rows))
+        n_lists = max(1, min(n_lists, len(training)))
+        self.centroids = _spherical_kmeans(training, n_lists, self.n_iter, rng)
+        self._assign_rows(_nearest_centroid(features, self.centroids))
+        return self
+
+    def add(self, features: np.ndarray) -> None:
+        """
+        Assign rows appended to the end of the feature matrix to their buckets.
+        The centroids are not retrained, and only the new rows are touched:
+        their indices go to per-bucket overflow chunks next to the packed lists.
+
+        Args:
+            features (np.ndarray): The full feature matrix, including the new rows
+        """
+        new_rows = np.arange(self.n_rows, len(features))
+        self.features = features
+        if not len(new_rows):
+            return
+        new_assignments = _nearest_centroid(features[new_rows], self.centroids)
+        order = np.argsort(new_assignments, kind="stable")
+        buckets, starts = np.unique(new_assignments[order], return_index=True)
+        for bucket, rows in zip(buckets.tolist(), np.split(new_rows[order], starts[1:])):
+            self._overflow[bucket].append(rows)
+        self._overflow_sizes += np.bincount(new_assignments, minlength=len(self.centroids))
+        self.n_rows = len(features)
+
+    def reassign(self, features: np.ndarray) -> None:
+        """
+        Re-bucket every row against the existing centroids, e.g. after the rows were rescaled.
+
+        Args:
+            features (np.ndarray): The full feature matrix
+        """
+        self.features = features
+        self._assign_rows(_nearest_centroid(features, self.centroids))
+
+    def _assign_rows(self, assignments: np.ndarray) -> None:
+        self.list_rows = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=len(self.centroids))
+        self.list_offsets = np.concatenate([[0], np.cumsum(counts)])
+        self._overflow = [[] for _ in range(len(self.centroids))]
+        self._overflow_sizes = np.zeros(len(self.centroids), dtype=int)
+        self.n_rows = len(assignments)
+
+    def _bucket_rows(self, bucket: int) -> np.ndarray:
+        """Row indices of one bucket, packed plus overflow"""
+        rows = self.list_rows[self.list_offsets[bucket]:self.list_offsets[bucket + 1]]
+        overflow = self._overflow[bucket]
+        if not overflow:
+            return rows
+        if len(overflow) > 1:
+            # Merge the chunks so later queries concatenate at most two arrays
+            overflow[:] = [np.concatenate(overflow)]
+        return np.concatenate([rows, overflow[0]])
+
+    def _compact(self) -> None:
+        """Fold the overflow chunks back into the packed bucket layout"""
+        if not any(self._overflow):
+            return
+        buckets = [self._bucket_rows(bucket) for bucket in range(len(self.centroids))]
+        self.list_rows = np.concatenate(buckets)
+        self.list_offsets = np.concatenate([[0], np.cumsum([len(rows) for rows in buckets])])
+        self._overflow = [[] for _ in range(len(self.centroids))]
+        self._overflow_sizes = np.zeros(len(self.centroids), dtype=int)
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find approximately the k most similar rows for each query.
+
+        Args:
+            queries (np.ndarray): Unit-length query vectors, one per row
+            k (int): Number of rows to return per query
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Row indices and similarity scores, best first
+        """
+        k = min(k, len(self.features))
+        queries = queries.astype(self.features.dtype, copy=False)
+        list_sizes = np.diff(self.list_offsets) + self._overflow_sizes
+        centroid_order = np.argsort(-(queries @ self.centroids.T), axis=1)
+
+        all_indices = np.zeros((len(queries), k), dtype=int)
+        all_scores = np.zeros((len(queries), k))
+        for i, query in enumerate(queries):
+            # Probe at least n_probe buckets, and more if they hold fewer than k rows
+            probes = centroid_order[i]
+            enough = np.searchsorted(np.cumsum(list_sizes[probes]), k) + 1
+            probes = probes[:max(self.n_probe, enough)]
+
+            candidates = np.concatenate([self._bucket_rows(p) for p in probes])
+            similarities = self.features[candidates] @ query
+            top, scores = _top_k(similarities[np.newaxis, :], k)
+            all_indices[i] = candidates[top[0]]
+            all_scores[i] = scores[0]
+        return all_indices, all_scores
+
+    def params(self) -> dict:
+        return {
+            'n_lists': self.n_lists,
+            'n_probe': self.n_probe,
+            'n_iter': self.n_iter,
+            'max_training_rows': self.max_training_rows,
+            'random_state': self.random_state
+        }
+
+    def save(self, path: Path) -> None:
+        """Save the trained centroids and bucket layout next to the feature matrix"""
+        self._compact()
+        np.savez(path / "ivf.npz", centroids=self.centroids,
+                 list_rows=self.list_rows, list_offsets=self.list_offsets)
+
+    def load(self, path: Path, features: np.ndarray) -> "IVFIndex":
+        """Restore a trained index, or train it if it was never saved"""
+        ivf_file = path / "ivf.npz"
+        if not ivf_file.exists():
+            return self.fit(features)
+        state = np.load(ivf_file)
+        self.features = features
+        self.centroids = state["centroids"]
+        self.list_rows = state["list_rows"]
+        self.list_offsets = state["list_offsets"]
+        self._overflow = [[] for _ in range(len(self.centroids))]
+        self._overflow_sizes = np.zeros(len(self.centroids), dtype=int)
+        self.n_rows = len(self.list_rows)
+        return self
+
+INDEX_TYPES = {
+    BruteForceIndex.index_type: BruteForceIndex,
+    IVFIndex.index_type: IVFIndex,
+}
+
+def create_index(index_type: str = "brute", **params):
+    """
+    Create an unfitted similarity index by name.
+
+    Args:
+        index_type (str): "brute" for exact search or "ivf" for approximate search
+        **params: Tuning parameters passed to the index
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {index_type}. Choose from {sorted(INDEX_TYPES)}")
+    return INDEX_TYPES[index_type](**params)
+
+def _top_k(similarities: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Select the top k columns per row without sorting the whole row"""
+    k = max(0, min(k, similarities.shape[1]))
+    if k == 0:
+        empty = np.empty((len(similarities), 0))
+        return empty.astype(int), empty
+
+    top_indices = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(similarities, top_indices, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    return np.take_along_axis(top_indices, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+def _nearest_centroid(features: np.ndarray, centroids: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+    """Assign each row to its most similar centroid, in chunks to bound memory"""
+    assignments = np.empty(len(features), dtype=int)
+    for start in range(0, len(features), chunk_size):
+        chunk = features[start:start + chunk_size]
+        assignments[start:start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+def _spherical_kmeans(data: np.ndarray, n_clusters: int, n_iter: int, rng: np.random.Generator) -> np.ndarray:
+    """Cluster unit-length rows by cosine similarity and return unit-length centroids"""
+    centroids = data[rng.choice(len(data), n_clusters, replace=False)].astype(data.dtype)
+    for _ in range(n_iter):
+        assignments = _nearest_centroid(data, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, data)
+        norms = np.linalg.norm(sums, axis=1)
+
+        # Keep the previous centroid for buckets that ended up empty
+        filled = norms > 0
+        centroids[filled] = sums[filled] / norms[filled, np.newaxis]
+    return centroids
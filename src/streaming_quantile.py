@@ -0,0 +1,151 @@
+"""
+Streaming quantile estimation with a merging t-digest.
+Keeps a few dozen weighted centroids instead of the whole signal, so
+thresholds such as the 75th-percentile activity level can be maintained while
+data arrives and combined across chunks and recordings.
+"""
+
+import numpy as np
+from typing import Dict, Iterable, Union
+
+class TDigest:
+    def __init__(self, compression: float = 100, buffer_size: int = 1000):
+        """
+        Initialize an empty digest.
+
+        Args:
+            compression (float): Accuracy parameter; the digest keeps about half this many centroids
+            buffer_size (int): Samples collected before they are merged into the centroids
+        """
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+        self._buffer_means = []
+        self._buffer_weights = []
+        self._scalars = []  # Single samples, kept as floats until the next merge
+        self._buffered = 0
+
+    @property
+    def count(self) -> float:
+        """Total weight of all samples seen"""
+        return float(self.weights.sum()) + sum(float(w.sum()) for w in self._buffer_weights) + len(self._scalars)
+
+    def update(self, values: Union[float, Iterable[float]]) -> "TDigest":
+        """
+        Add one sample or an array of samples; NaNs are ignored.
+
+        Samples are buffered and merged in batches, so the cost per sample is
+        amortized over the buffer.
+
+        Returns:
+            TDigest: self, for chaining
+        """
+        if isinstance(values, (int, float)):
+            # Fast path for live streams feeding one sample at a time
+            if values == values:
+                self._scalars.append(values)
+                self.min = min(self.min, values)
+                self.max = max(self.max, values)
+                self._buffered += 1
+                if self._buffered >= self.buffer_size:
+                    self._compress()
+            return self
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if len(values):
+            self._add(values, np.ones(len(values)))
+        return self
+
+    def merge(self, other: "TDigest") -> "TDigest":
+        """
+        Fold another digest (e.g. of a different chunk or recording) into this one.
+
+        Returns:
+            TDigest: self, for chaining
+        """
+        other._compress()
+        if len(other.means):
+            self._add(other.means, other.weights)
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q: Union[float, Iterable[float]]) -> Union[float, np.ndarray]:
+        """
+        Estimate one or more quantiles.
+
+        Args:
+            q: Quantile(s) between 0 and 1
+
+        Returns:
+            The estimated value(s), NaN if the digest is empty
+        """
+        self._compress()
+        q = np.asarray(q, dtype=float)
+        if not len(self.means):
+            return np.full(q.shape, np.nan)[()]
+
+        # Each centroid sits at the middle of its cumulative weight; the extremes pin the ends
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2
+        positions = np.concatenate([[0.0], centers, [total]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return np.interp(np.clip(q, 0, 1) * total, positions, values)[()]
+
+    def to_dict(self) -> Dict:
+        """Serialize the digest to plain lists"""
+        self._compress()
+        return {
+            "compression": self.compression,
+            "means": self.means.tolist(),
+            "weights": self.weights.tolist(),
+            "min": self.min if len(self.means) else None,
+            "max": self.max if len(self.means) else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "TDigest":
+        """Restore a digest serialized with to_dict()"""
+        digest = cls(compression=data["compression"])
+        digest.means = np.asarray(data["means"], dtype=float)
+        digest.weights = np.asarray(data["weights"], dtype=float)
+        if len(digest.means):
+            digest.min, digest.max = data["min"], data["max"]
+        return digest
+
+    def _add(self, means: np.ndarray, weights: np.ndarray) -> None:
+        self._buffer_means.append(means)
+        self._buffer_weights.append(weights)
+        self._buffered += len(means)
+        self.min = min(self.min, float(means.min()))
+        self.max = max(self.max, float(means.max()))
+        if self._buffered >= self.buffer_size:
+            self._compress()
+
+    def _compress(self) -> None:
+        """
+        Merge the buffer into the centroids.
+
+        Sorted points are binned by the k1 scale function k(q) = compression / (2 pi) * asin(2q - 1);
+        each unit of k becomes one centroid, so centroids are small near the tails and
+        large around the median.
+        """
+        if not self._buffered:
+            return
+        scalars = np.array(self._scalars, dtype=float)
+        means = np.concatenate([self.means, scalars] + self._buffer_means)
+        weights = np.concatenate([self.weights, np.ones(len(scalars))] + self._buffer_weights)
+        self._buffer_means, self._buffer_weights, self._scalars, self._buffered = [], [], [], 0
+
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        q_left = (cumulative - weights) / cumulative[-1]
+        k = np.floor(self.compression / (2 * np.pi) * np.arcsin(2 * q_left - 1))
+
+        starts = np.flatnonzero(np.concatenate([[True], k[1:] != k[:-1]]))
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights